@@ -1,8 +1,14 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+from buildstats import patch
+
 with open('css/styles.css', 'r', encoding='utf-8') as f:
     css = f.read()
 
 # Make section-subtitle brighter with better contrast
-css = css.replace(
+css = patch(css,
     '''.section-subtitle {
     font-size: 1.125rem;
     font-weight: var(--font-weight-regular);
@@ -16,7 +22,7 @@ css = css.replace(
     color: var(--text-charcoal);
     text-align: center;
     margin-bottom: var(--spacing-lg);
-}''')
+}''', name='Make section-subtitle brighter with better contrast')
 
 with open('css/styles.css', 'w', encoding='utf-8') as f:
     f.write(css)
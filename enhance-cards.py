@@ -1,8 +1,14 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+from buildstats import patch
+
 with open('css/styles.css', 'r', encoding='utf-8') as f:
     css = f.read()
 
 # Enhance glass cards (How It Works section)
-css = css.replace(
+css = patch(css,
     '''    box-shadow: 0 8px 32px var(--shadow-light);
     transition: all var(--transition-medium);
 }
@@ -21,10 +27,10 @@ css = css.replace(
     box-shadow: 0 20px 60px rgba(74, 144, 226, 0.35), 0 0 0 1px rgba(74, 144, 226, 0.2);
     background: rgba(255, 255, 255, 0.95);
     border-color: rgba(74, 144, 226, 0.3);
-}''')
+}''', name='Enhance glass cards (How It Works section)')
 
 # Enhance category tiles
-css = css.replace(
+css = patch(css,
     '''    cursor: pointer;
 }
 
@@ -63,10 +69,10 @@ css = css.replace(
 
 .category-tile:hover .category-icon {
     transform: scale(1.15) rotate(5deg);
-}''')
+}''', name='Enhance category tiles')
 
 # Add transform transition to category icon
-css = css.replace(
+css = patch(css,
     '''.category-icon {
     font-size: 3rem;
     margin-bottom: var(--spacing-sm);
@@ -77,10 +83,10 @@ css = css.replace(
     margin-bottom: var(--spacing-sm);
     display: block;
     transition: transform 0.3s ease;
-}''')
+}''', name='Add transform transition to category icon')
 
 # Enhance listing cards
-css = css.replace(
+css = patch(css,
     '''    cursor: pointer;
 }
 
@@ -117,20 +123,20 @@ css = css.replace(
 .listing-card:hover .listing-badge {
     transform: scale(1.1);
     box-shadow: 0 4px 12px rgba(0, 0, 0, 0 .2);
-}''')
+}''', name='Enhance listing cards')
 
 # Add transform to listing badge
-css = css.replace(
+css = patch(css,
     '''    backdrop-filter: blur(8px);
     -webkit-backdrop-filter: blur(8px);
 }''',
     '''    backdrop-filter: blur(8px);
     -webkit-backdrop-filter: blur(8px);
     transition: all 0.3s ease;
-}''')
+}''', name='Add transform to listing badge')
 
 # Enhance safety feature cards
-css = css.replace(
+css = patch(css,
     '''.safety-feature:hover {
     background: rgba(255, 255, 255, 0.85);
     transform: translateY(-4px);
@@ -146,10 +152,10 @@ css = css.replace(
 
 .safety-feature:hover .feature-icon {
     transform: scale(1.2) rotate(5deg);
-}''')
+}''', name='Enhance safety feature cards')
 
 # Add transform to feature icon
-css = css.replace(
+css = patch(css,
     '''.feature-icon {
     font-size: 2rem;
     line-height: 1;
@@ -160,10 +166,10 @@ css = css.replace(
     line-height: 1;
     flex-shrink: 0;
     transition: transform 0.3s ease;
-}''')
+}''', name='Add transform to feature icon')
 
 # Enhance card icons with bounce animation
-css = css.replace(
+css = patch(css,
     '''.card-icon {
     font-size: 3rem;
     margin-bottom: var(--spacing-sm);
@@ -183,7 +189,7 @@ css = css.replace(
     25% { transform: translateY(-10px); }
     50% { transform: translateY(-5px); }
     75% { transform: translateY(-8px); }
-}''')
+}''', name='Enhance card icons with bounce animation')
 
 with open('css/styles.css', 'w', encoding='utf-8') as f:
     f.write(css)
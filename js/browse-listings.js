@@ -52,6 +52,9 @@ document.addEventListener('DOMContentLoaded', function () {
         // Show loading initially
         showLoading();
 
+        // Price table for deal badges, fetched alongside the listings
+        const dealScores = window.DealScore ? window.DealScore.load() : Promise.resolve();
+
         try {
             // Wait for Firebase to be ready
             await waitForFirebase();
@@ -69,6 +72,8 @@ document.addEventListener('DOMContentLoaded', function () {
             allListings = [...sampleListings];
         }
 
+        await dealScores;
+
         filteredListings = [...allListings];
 
         // Build search index
@@ -436,6 +441,7 @@ document.addEventListener('DOMContentLoaded', function () {
                     <div>
                         ${listing.featured ? '<span class="badge badge-featured">Featured</span>' : ''}
                         ${isNew ? '<span class="badge badge-new">New</span>' : ''}
+                        ${window.DealScore ? window.DealScore.badgeHTML(listing) : ''}
                     </div>
                 </div>
                 ${window.Utils ? window.Utils.createFavoriteButton(listing.id, false) : ''}
@@ -0,0 +1,109 @@
+// Deal Score
+// Rates a listing's price against similar listings using the lookup table
+// built by tools/price_stats.py (data/prices.json), one bucket lookup per listing
+
+(function () {
+    // data/ sits at the site root, one level above this script
+    const tableUrl = new URL('../data/prices.json', document.currentScript.src);
+
+    // Percentile rank thresholds, lower rank = cheaper than similar listings
+    const RATINGS = [
+        { maxRank: 20, label: 'Great price', tone: 'great' },
+        { maxRank: 40, label: 'Good price', tone: 'good' },
+        { maxRank: 70, label: 'Fair price', tone: 'fair' },
+        { maxRank: 100, label: 'Above market', tone: 'high' }
+    ];
+
+    let table = null;
+    let loading = null;
+
+    /**
+     * Fetch the price table once; resolves to null if it is not deployed
+     * @returns {Promise<Object|null>}
+     */
+    function load() {
+        if (!loading) {
+            loading = fetch(tableUrl.href)
+                .then(response => (response.ok ? response.json() : null))
+                .catch(() => null)
+                .then(data => {
+                    table = data;
+                    return data;
+                });
+        }
+        return loading;
+    }
+
+    /**
+     * Bucket keys from most to least specific, must match bucket_keys() in tools/price_stats.py
+     * @param {Object} listing
+     * @returns {string[]}
+     */
+    function bucketKeys(listing) {
+        const clean = value => String(value || '').trim().toLowerCase();
+        const category = clean(listing.category) || 'other';
+        const subcategory = clean(listing.subcategory);
+        const condition = clean(listing.condition);
+        const province = clean(listing.location && listing.location.province);
+
+        const keys = [category];
+        if (subcategory) {
+            const base = `${category}/${subcategory}`;
+            keys.unshift(base);
+            if (condition) {
+                keys.unshift(`${base}|${condition}`);
+                if (province) keys.unshift(`${base}|${condition}|${province}`);
+            }
+        }
+        return keys;
+    }
+
+    // Percentile (0-100) of price within a bucket, interpolated between the stored quantiles
+    function percentileRank(price, quantiles, step) {
+        const last = quantiles.length - 1;
+        if (price <= quantiles[0]) return 0;
+        if (price >= quantiles[last]) return 100;
+        for (let i = 0; i < last; i++) {
+            if (price < quantiles[i + 1]) {
+                const span = quantiles[i + 1] - quantiles[i];
+                return step * (i + (span > 0 ? (price - quantiles[i]) / span : 0));
+            }
+        }
+        return 100;
+    }
+
+    /**
+     * Score a listing, null until load() has finished or when there is no comparable bucket
+     * @param {Object} listing
+     * @returns {{rank: number, label: string, tone: string, median: number, sampleSize: number}|null}
+     */
+    function score(listing) {
+        const price = Number(listing.price);
+        if (!table || !(price > 0)) return null;
+
+        const bucket = bucketKeys(listing).map(key => table.buckets[key]).find(Boolean);
+        if (!bucket) return null;
+
+        const rank = Math.round(percentileRank(price, bucket.q, table.quantileStep));
+        const rating = RATINGS.find(r => rank <= r.maxRank);
+        return { rank, label: rating.label, tone: rating.tone, median: bucket.m, sampleSize: bucket.n };
+    }
+
+    /**
+     * Card badge for great/good prices, empty string otherwise
+     * @param {Object} listing
+     * @returns {string}
+     */
+    function badgeHTML(listing) {
+        const result = score(listing);
+        if (!result || (result.tone !== 'great' && result.tone !== 'good')) return '';
+        return `<span class="badge badge-deal badge-deal-${result.tone}">${result.label}</span>`;
+    }
+
+    window.DealScore = {
+        load,
+        bucketKeys,
+        score,
+        badgeHTML
+    };
+})();
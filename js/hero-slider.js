@@ -12,8 +12,27 @@ function initHeroSlider() {
     let currentSlide = 0;
     let slideInterval;
 
+    // Swap the full image in over the CSS placeholder once it has downloaded
+    function loadSlide(slide) {
+        const src = slide.dataset.src;
+        if (!src || slide.dataset.loaded) return;
+        slide.dataset.loaded = 'true';
+
+        const img = new Image();
+        img.onload = () => {
+            slide.style.backgroundImage = `url('${src}')`;
+        };
+        img.src = src;
+    }
+
+    // First slide right away, the rest once the page has finished loading
+    if (slides.length) loadSlide(slides[0]);
+    window.addEventListener('load', () => slides.forEach(loadSlide));
+
     // Function to show specific slide
     function showSlide(index) {
+        loadSlide(slides[index]);
+
         // Remove active class from all slides and dots
         slides.forEach(slide => slide.classList.remove('active'));
         dots.forEach(dot => dot.classList.remove('active'));
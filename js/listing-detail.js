@@ -2,9 +2,12 @@
 // Handles listing display, image gallery, lightbox, and similar listings
 
 document.addEventListener('DOMContentLoaded', function () {
+    // Static pages from tools/prerender.py embed the listing, no ?id= needed
+    const prerendered = window.PRERENDERED_LISTING || null;
+
     // Get listing ID from URL
     const urlParams = new URLSearchParams(window.location.search);
-    const listingId = urlParams.get('id');
+    const listingId = urlParams.get('id') || (prerendered && prerendered.id);
 
     if (!listingId) {
         // Redirect to browse if no ID provided
@@ -20,8 +23,12 @@ document.addEventListener('DOMContentLoaded', function () {
     loadListingData();
 
     async function loadListingData() {
-        // 1. Try sample data first (fastest)
-        listing = sampleListings.find(l => l.id === listingId);
+        // 1. Use the prerendered copy or sample data first (fastest)
+        if (prerendered && prerendered.id === listingId) {
+            listing = { ...prerendered, price: Number(prerendered.price) };
+        } else {
+            listing = sampleListings.find(l => l.id === listingId);
+        }
 
         // 2. If not found, try Firestore
         if (!listing) {
@@ -118,6 +125,19 @@ document.addEventListener('DOMContentLoaded', function () {
         updateBreadcrumb();
     }
 
+    function renderDealScore() {
+        const dealScore = document.getElementById('dealScore');
+        const result = window.DealScore.score(listing);
+        if (!dealScore || !result) return;
+
+        dealScore.className = `deal-score deal-score-${result.tone}`;
+        dealScore.textContent = result.rank < 50
+            ? `${result.label} · lower than ${100 - result.rank}% of similar listings`
+            : `${result.label} · typical price $${result.median.toLocaleString()}`;
+        dealScore.title = `Compared with ${result.sampleSize.toLocaleString()} similar listings`;
+        dealScore.style.display = 'inline-block';
+    }
+
     // Render listing information
     function renderListing() {
         // Category
@@ -132,6 +152,11 @@ document.addEventListener('DOMContentLoaded', function () {
         document.getElementById('listingPrice').textContent =
             `$${listing.price.toLocaleString()}`;
 
+        // Deal score against similar listings (tools/price_stats.py)
+        if (window.DealScore) {
+            window.DealScore.load().then(renderDealScore);
+        }
+
         // Badges
         if (listing.featured) {
             document.getElementById('featuredBadge').style.display = 'inline-block';
@@ -0,0 +1,19 @@
+// Service Worker Registration
+// Registers sw.js (generated by tools/precache.py) so repeat visits load the
+// app shell from cache instead of re-validating every asset
+
+(function () {
+    if (!('serviceWorker' in navigator)) return;
+
+    // The dev server runs with caching off, keep it that way while developing
+    const host = window.location.hostname;
+    if (host === 'localhost' || host === '127.0.0.1') return;
+
+    // sw.js sits at the site root, one level above this script
+    const swUrl = new URL('../sw.js', document.currentScript.src);
+
+    window.addEventListener('load', () => {
+        navigator.serviceWorker.register(swUrl.href)
+            .catch(error => console.warn('Service worker registration failed:', error));
+    });
+})();
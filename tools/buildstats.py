@@ -0,0 +1,319 @@
+# Build instrumentation
+#
+# Every tool and patcher reports into one process-wide recorder:
+#   with stage('precache.scan'):      wall + CPU time per named stage
+#   for x in staged('name', gen):     the same for the work a generator does per item
+#   count('cache.hit')                counters, attributed to the current stage
+#   read_text / write_text / patch    file helpers that count bytes and patch matches
+#
+# finish('<tool>') prints a per-stage summary table and writes a trace-event
+# JSON to .build-cache/trace-<tool>.json (open it in chrome://tracing or Perfetto).
+#
+# CPU time includes child processes (ProcessPoolExecutor workers) once they
+# have exited, so shut a pool down inside the stage that uses it.
+#
+# Recording is a few clock reads per stage and a dict update per counter, so it
+# stays on by default. Set BUILD_STATS=0 to turn it off.
+#
+# Legacy single-shot patchers can be run under instrumentation unchanged:
+#   python tools/buildstats.py enhance-cards.py brighten-subtitle.py
+# Their file I/O is counted either way; matched/unmatched only count edits made
+# with patch(), a plain str.replace cannot report whether it found anything.
+
+import builtins
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Windows: child processes' CPU time is not available
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACE_DIR = os.path.join(ROOT, '.build-cache')
+
+ENABLED = os.environ.get('BUILD_STATS', '1') != '0'
+
+# Counters shown as columns in the summary table, in order
+COLUMNS = [
+    ('bytes.read', 'read'),
+    ('bytes.written', 'written'),
+    ('cache.hit', 'hits'),
+    ('cache.miss', 'misses'),
+    ('patch.matched', 'matched'),
+    ('patch.unmatched', 'unmatched'),
+]
+
+NO_STAGE = '(no stage)'
+
+
+def cpu_time_ns():
+    """CPU time of this process plus its exited child processes."""
+    cpu = time.process_time_ns()
+    if resource:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu += int((usage.ru_utime + usage.ru_stime) * 1e9)
+    return cpu
+
+
+class BuildStats:
+    def __init__(self):
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.stages = {}        # name -> [calls, wall_ns, cpu_ns]
+        self.counters = {}      # (stage, counter) -> value
+        self.unmatched = []     # names of patches that did not apply
+        self.events = []        # trace events
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current_stage(self):
+        stack = self._stack()
+        return stack[-1] if stack else NO_STAGE
+
+    @contextmanager
+    def stage(self, name, **args):
+        if not ENABLED:
+            yield
+            return
+
+        stack = self._stack()
+        stack.append(name)
+        wall0 = time.perf_counter_ns()
+        cpu0 = cpu_time_ns()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter_ns() - wall0
+            cpu = cpu_time_ns() - cpu0
+            stack.pop()
+            with self._lock:
+                totals = self.stages.setdefault(name, [0, 0, 0])
+                totals[0] += 1
+                totals[1] += wall
+                totals[2] += cpu
+                event = {
+                    'name': name, 'cat': 'stage', 'ph': 'X',
+                    'ts': (wall0 - self.origin) / 1000, 'dur': wall / 1000,
+                    'pid': self.pid, 'tid': threading.get_ident(),
+                    'args': dict(args, cpu_ms=round(cpu / 1e6, 3)),
+                }
+                self.events.append(event)
+                self._snapshot_counters(wall0 + wall)
+
+    def _snapshot_counters(self, ts_ns):
+        # One counter event per stage exit keeps the trace small even when
+        # count() is called for every file
+        totals = {}
+        for (_, name), value in self.counters.items():
+            totals[name] = totals.get(name, 0) + value
+        if totals:
+            self.events.append({
+                'name': 'counters', 'ph': 'C', 'ts': (ts_ns - self.origin) / 1000,
+                'pid': self.pid, 'args': totals,
+            })
+
+    def count(self, name, n=1):
+        if not ENABLED:
+            return
+        key = (self.current_stage(), name)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def note_unmatched(self, name):
+        if ENABLED:
+            self.unmatched.append(name)
+
+    def rows(self):
+        names = list(self.stages)
+        if any(stage == NO_STAGE for stage, _ in self.counters):
+            names.append(NO_STAGE)
+
+        rows = []
+        for name in names:
+            calls, wall, cpu = self.stages.get(name, [0, 0, 0])
+            values = [self.counters.get((name, key), 0) for key, _ in COLUMNS]
+            rows.append([name, calls, wall / 1e6, cpu / 1e6] + values)
+        return rows
+
+    def summary(self, title):
+        header = ['stage', 'calls', 'wall ms', 'cpu ms'] + [label for _, label in COLUMNS]
+        body = []
+        for row in self.rows():
+            cells = [row[0], str(row[1]), f'{row[2]:.1f}', f'{row[3]:.1f}']
+            for (key, _), value in zip(COLUMNS, row[4:]):
+                cells.append(format_bytes(value) if key.startswith('bytes.') else str(value))
+            body.append(cells)
+
+        widths = [max(len(r[i]) for r in [header] + body) for i in range(len(header))]
+
+        def line(cells):
+            return '  '.join(c.ljust(w) if i == 0 else c.rjust(w)
+                             for i, (c, w) in enumerate(zip(cells, widths)))
+
+        out = [f'Build stats: {title}', line(header), line(['-' * w for w in widths])]
+        out.extend(line(r) for r in body)
+        for name in self.unmatched:
+            out.append(f'Unmatched patch: {name}')
+        return '\n'.join(out)
+
+    def trace(self):
+        meta = {'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+                'args': {'name': os.path.basename(sys.argv[0]) or 'python'}}
+        return {'traceEvents': [meta] + self.events, 'displayTimeUnit': 'ms'}
+
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024:
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
+    return f'{n:.1f} GB'
+
+
+stats = BuildStats()
+stage = stats.stage
+count = stats.count
+
+
+def staged(name, iterable):
+    """Iterate with every step inside stage(name), so what a generator reads
+    between the items it yields is not left outside any stage."""
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    count('bytes.read', len(text.encode('utf-8')))
+    return text
+
+
+def write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    count('bytes.written', len(text.encode('utf-8')))
+
+
+def patch(text, old, new, name=None):
+    """str.replace that records whether the snippet was found."""
+    if old in text:
+        count('patch.matched')
+        return text.replace(old, new)
+
+    count('patch.unmatched')
+    stats.note_unmatched(name or old.strip().splitlines()[0][:60])
+    return text
+
+
+def finish(tool):
+    """Print the summary table and write the trace for this run."""
+    if not ENABLED or not stats.stages:
+        return
+    print('')
+    print(stats.summary(tool))
+
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    path = os.path.join(TRACE_DIR, f'trace-{tool}.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(stats.trace(), f)
+    print(f'Trace written to {os.path.relpath(path, ROOT)}')
+
+
+class _CountingFile:
+    """File proxy that reports bytes passed through read/write."""
+
+    def __init__(self, f):
+        self._f = f
+
+    def _size(self, data):
+        return len(data.encode('utf-8')) if isinstance(data, str) else len(data)
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        count('bytes.read', self._size(data))
+        return data
+
+    def readline(self, *args):
+        data = self._f.readline(*args)
+        count('bytes.read', self._size(data))
+        return data
+
+    def readlines(self, *args):
+        lines = self._f.readlines(*args)
+        count('bytes.read', sum(self._size(l) for l in lines))
+        return lines
+
+    def write(self, data):
+        count('bytes.written', self._size(data))
+        return self._f.write(data)
+
+    def __iter__(self):
+        for line in self._f:
+            count('bytes.read', self._size(line))
+            yield line
+
+    def __enter__(self):
+        self._f.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._f.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+def run_script(script):
+    """Run an unmodified patcher script with its file I/O counted."""
+    real_open = builtins.open
+
+    def counting_open(*args, **kwargs):
+        return _CountingFile(real_open(*args, **kwargs))
+
+    builtins.open = counting_open
+    try:
+        with stage(os.path.basename(script)):
+            runpy.run_path(script, run_name='__main__')
+    finally:
+        builtins.open = real_open
+
+
+def main():
+    scripts = sys.argv[1:]
+    if not scripts:
+        print('Usage: python tools/buildstats.py <patcher.py> [<patcher.py> ...]')
+        sys.exit(1)
+
+    # Patchers that import buildstats must get this module and its recorder,
+    # not a second copy loaded under its own name
+    sys.modules.setdefault('buildstats', sys.modules[__name__])
+
+    scripts = [os.path.abspath(s) for s in scripts]
+    os.chdir(ROOT)
+    for script in scripts:
+        run_script(script)
+    finish('patchers')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+# adminLogs compaction
+#
+# js/admin-auth.js writes an adminLogs document for every admin action and
+# nothing ever removes them. This folds everything older than --days into:
+#   archives/adminLogs/YYYY/MM/YYYY-MM-DD.ndjson.gz   the raw entries, one per line
+#   adminLogSummaries/YYYY-MM-DD                      per-day counts per admin and action
+# and then deletes the raw entries in batches, so the live collection only
+# holds recent activity and the full audit history is still on disk.
+#
+# Days are processed one at a time: archive, then summary, then delete. The
+# archive is merged with any existing one and the summary is rebuilt from it,
+# so a run that dies halfway can be re-run without losing or double counting
+# anything.
+#
+# Sources:
+#   <export>      an adminLogs export (.ndjson/.jsonl or .json, documents with "id").
+#                 Summaries go to --summaries, the entries that stay to --remaining.
+#   --firestore   the live collection through the Admin SDK (pip install firebase-admin,
+#                 credentials from GOOGLE_APPLICATION_CREDENTIALS).
+#
+# Usage: python tools/compact_admin_logs.py <export> [--days 30] [--summaries adminLogSummaries.ndjson]
+#            [--remaining adminLogs.remaining.ndjson]
+#        python tools/compact_admin_logs.py --firestore [--days 30] [--dry-run]
+
+import argparse
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from buildstats import count, finish, stage, staged, write_text
+from listings_export import iso_timestamp, iter_documents, timestamp_ms
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLLECTION = 'adminLogs'
+SUMMARY_COLLECTION = 'adminLogSummaries'
+DEFAULT_ARCHIVE_DIR = 'archives/adminLogs'
+DEFAULT_SUMMARIES = 'adminLogSummaries.ndjson'
+DEFAULT_DAYS = 30
+
+# Firestore allows 500 writes per batch
+BATCH_SIZE = 500
+PAGE_SIZE = 1000
+
+
+def day_of(doc):
+    ms = timestamp_ms(doc.get('createdAt'))
+    if ms is None:
+        return None
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).date()
+
+
+def archive_path(archive_dir, day):
+    return os.path.join(archive_dir, f'{day:%Y}', f'{day:%m}', f'{day.isoformat()}.ndjson.gz')
+
+
+def read_archive(path):
+    entries = {}
+    if os.path.exists(path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    doc = json.loads(line)
+                    entries[doc['id']] = doc
+        count('bytes.read', os.path.getsize(path))
+    return entries
+
+
+def write_archive(path, entries):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        for doc in entries:
+            f.write(json.dumps(doc, ensure_ascii=False, sort_keys=True) + '\n')
+    # Replace in one step so a crash never leaves a truncated archive
+    os.replace(tmp, path)
+    count('bytes.written', os.path.getsize(path))
+
+
+def summarise(day, entries, archive):
+    by_action = {}
+    by_admin = {}
+    for doc in entries:
+        action = doc.get('action') or 'unknown'
+        by_action[action] = by_action.get(action, 0) + 1
+        admin = by_admin.setdefault(doc.get('adminId') or 'unknown', {
+            'email': doc.get('adminEmail') or '',
+            'name': doc.get('adminName') or doc.get('adminEmail') or '',
+            'total': 0,
+            'actions': {},
+        })
+        admin['total'] += 1
+        admin['actions'][action] = admin['actions'].get(action, 0) + 1
+
+    times = sorted(timestamp_ms(doc.get('createdAt')) for doc in entries)
+    return {
+        'date': day.isoformat(),
+        'total': len(entries),
+        'first': iso_timestamp(times[0]),
+        'last': iso_timestamp(times[-1]),
+        'byAction': dict(sorted(by_action.items())),
+        'byAdmin': dict(sorted(by_admin.items())),
+        'archive': archive.replace(os.sep, '/'),
+        'compactedAt': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+    }
+
+
+def plain(value):
+    """Firestore values (timestamps, references) as JSON-friendly values."""
+    if isinstance(value, datetime):
+        return iso_timestamp(value.isoformat())
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+# ---------- Sources ----------
+
+class ExportSource:
+    """An adminLogs export on disk. Deletes and summaries are written to files."""
+
+    def __init__(self, path, summaries_path, remaining_path):
+        self.path = path
+        self.summaries_path = summaries_path
+        self.remaining_path = remaining_path
+        self.summaries = {}
+        if summaries_path and os.path.exists(summaries_path):
+            for doc in iter_documents(summaries_path, SUMMARY_COLLECTION):
+                self.summaries[doc['date']] = doc
+        self.deleted = set()
+        self.batches = 0
+
+    def days_before(self, cutoff):
+        days = {}
+        for doc in iter_documents(self.path, COLLECTION):
+            day = day_of(doc)
+            if day is not None and day < cutoff and doc.get('id'):
+                days.setdefault(day, []).append(doc)
+        for day in sorted(days):
+            yield day, days[day]
+
+    def write_summary(self, summary):
+        self.summaries[summary['date']] = summary
+
+    def delete(self, ids):
+        self.deleted.update(ids)
+        self.batches += -(-len(ids) // BATCH_SIZE)
+
+    def close(self):
+        if self.summaries_path:
+            lines = [json.dumps(s, ensure_ascii=False) for _, s in sorted(self.summaries.items())]
+            write_text(self.summaries_path, ''.join(line + '\n' for line in lines))
+        if self.remaining_path:
+            kept = [json.dumps(doc, ensure_ascii=False) for doc in iter_documents(self.path, COLLECTION)
+                    if doc.get('id') not in self.deleted]
+            write_text(self.remaining_path, ''.join(line + '\n' for line in kept))
+
+
+class FirestoreSource:
+    """The live adminLogs collection, read in createdAt order one page at a time."""
+
+    def __init__(self):
+        try:
+            import firebase_admin
+            from firebase_admin import firestore
+        except ImportError:
+            sys.exit('firebase-admin is required for --firestore: pip install firebase-admin')
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app()
+        self.db = firestore.client()
+        self.batches = 0
+
+    def days_before(self, cutoff):
+        cutoff_dt = datetime.combine(cutoff, datetime.min.time(), tzinfo=timezone.utc)
+        query = (self.db.collection(COLLECTION)
+                 .where('createdAt', '<', cutoff_dt)
+                 .order_by('createdAt')
+                 .limit(PAGE_SIZE))
+        current, docs = None, []
+        last = None
+        while True:
+            page = list((query.start_after(last) if last else query).stream())
+            count('firestore.read', len(page))
+            for snapshot in page:
+                doc = plain(dict(snapshot.to_dict(), id=snapshot.id))
+                day = day_of(doc)
+                if day != current and docs:
+                    yield current, docs
+                    docs = []
+                current = day
+                docs.append(doc)
+            if len(page) < PAGE_SIZE:
+                break
+            last = page[-1]
+        if docs:
+            yield current, docs
+
+    def write_summary(self, summary):
+        self.db.collection(SUMMARY_COLLECTION).document(summary['date']).set(summary)
+
+    def delete(self, ids):
+        collection = self.db.collection(COLLECTION)
+        for i in range(0, len(ids), BATCH_SIZE):
+            batch = self.db.batch()
+            for doc_id in ids[i:i + BATCH_SIZE]:
+                batch.delete(collection.document(doc_id))
+            batch.commit()
+            self.batches += 1
+
+    def close(self):
+        pass
+
+
+# ---------- Main ----------
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive and summarise old adminLogs entries.')
+    parser.add_argument('export', nargs='?', help='adminLogs export (.ndjson/.jsonl or .json)')
+    parser.add_argument('--firestore', action='store_true', help='compact the live collection instead of an export')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='keep this many days of raw entries')
+    parser.add_argument('--archive-dir', help=f'where the .ndjson.gz archives go (default {DEFAULT_ARCHIVE_DIR})')
+    parser.add_argument('--summaries', help=f'summary documents file (export mode, default {DEFAULT_SUMMARIES})')
+    parser.add_argument('--remaining', help='write the entries that are kept here (export mode)')
+    parser.add_argument('--dry-run', action='store_true', help='report what would be compacted, change nothing')
+    args = parser.parse_args()
+
+    if bool(args.export) == args.firestore:
+        parser.error('give either an export file or --firestore')
+
+    # Given paths are relative to where the command runs, defaults to the repository root,
+    # so archives never land in a served directory like pages/
+    export = os.path.abspath(args.export) if args.export else None
+    summaries = os.path.abspath(args.summaries) if args.summaries else os.path.join(ROOT, DEFAULT_SUMMARIES)
+    remaining = os.path.abspath(args.remaining) if args.remaining else None
+    archive_dir = os.path.abspath(args.archive_dir) if args.archive_dir else os.path.join(ROOT, DEFAULT_ARCHIVE_DIR)
+    os.chdir(ROOT)
+
+    # Whole UTC days only, so every summary covers a complete day
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=args.days)
+    with stage('compact.scan'):
+        source = FirestoreSource() if args.firestore else ExportSource(export, summaries, remaining)
+
+    days = 0
+    compacted = 0
+    by_action = {}
+    # The export is read (or Firestore paged) while the generator runs
+    for day, docs in staged('compact.scan', source.days_before(cutoff)):
+        with stage('compact.day', date=day.isoformat()):
+            days += 1
+            compacted += len(docs)
+            path = archive_path(archive_dir, day)
+            entries = read_archive(path)
+            for doc in docs:
+                entries[doc['id']] = doc
+            ordered = sorted(entries.values(), key=lambda d: (timestamp_ms(d.get('createdAt')) or 0, d['id']))
+            summary = summarise(day, ordered, os.path.relpath(path, ROOT))
+            for doc in docs:
+                action = doc.get('action') or 'unknown'
+                by_action[action] = by_action.get(action, 0) + 1
+            if args.dry_run:
+                continue
+            write_archive(path, ordered)
+            source.write_summary(summary)
+            source.delete([doc['id'] for doc in docs])
+
+    if not args.dry_run:
+        with stage('compact.close'):
+            source.close()
+
+    verb = 'Would compact' if args.dry_run else 'Compacted'
+    print(f"{verb} {compacted:,} entries older than {cutoff.isoformat()} into {days} daily summaries")
+    if not args.dry_run:
+        print(f"Deleted in {source.batches} batches of up to {BATCH_SIZE}; archives in "
+              f"{os.path.relpath(archive_dir, ROOT)}/")
+    for action, n in sorted(by_action.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {n:>8,}  {action}")
+
+    finish('compact')
+
+
+if __name__ == '__main__':
+    main()
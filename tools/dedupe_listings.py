@@ -0,0 +1,373 @@
+# Near-duplicate listing detection for the moderation queue
+#
+# Shingles each listing's title + description into word 3-grams, builds a
+# MinHash signature and indexes it in LSH bands. Listings that share a band
+# are candidates, candidates whose signatures agree on at least --threshold
+# of their positions are reported, grouped into clusters:
+#   same-seller   one seller posting the same item again (repost)
+#   cross-seller  near-identical text from different sellers (likely spam)
+#
+# Candidate lookup is a sort per band, so a full run is close to linear in the
+# number of listings rather than comparing every pair.
+#
+# Only active listings are indexed: a sold item relisted by its seller or a
+# draft next to its published ad is not a repost.
+#
+# The index is persisted under .build-cache/dedupe/ as append-only files.
+# --incremental only signs listings that are not in the index yet and reports
+# the clusters they join, so it can run every hour. Indexed listings that are
+# no longer active in the export are dropped, which rewrites the index once.
+#
+# Listings with no words in title or description are not signed, they would
+# all look identical to each other. From a listing store only the
+# LISTING_FIELDS columns are read.
+#
+# --self-test compares MinHash estimates with the exact Jaccard similarity of
+# random shingle sets and exits non-zero if they disagree.
+#
+# Usage: python tools/dedupe_listings.py <export> [--incremental] [--threshold 0.6]
+#            [--out duplicates.json]
+#        python tools/dedupe_listings.py --self-test
+
+import argparse
+import json
+import os
+import re
+import sys
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    sys.exit('NumPy is required: pip install -r tools/requirements.txt')
+
+from buildstats import count, finish, stage, write_text
+from filehash import CACHE_DIR
+from listings_export import iter_listings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INDEX_DIR = os.path.join(CACHE_DIR, 'dedupe')
+IDS_PATH = os.path.join(INDEX_DIR, 'ids.ndjson')
+SIGNATURES_PATH = os.path.join(INDEX_DIR, 'signatures.u32')
+BANDS_PATH = os.path.join(INDEX_DIR, 'bands.u64')
+VERSION_PATH = os.path.join(INDEX_DIR, 'version')
+
+# Bump when signatures change, an index from another version is rebuilt
+INDEX_VERSION = 2
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+# Buckets bigger than this are not expanded pair by pair. If they come from
+# only a few sellers they are one reposting / spam flood and become a single
+# cluster; if they span more sellers than BOILERPLATE_SELLERS they are
+# boilerplate ("call for details") and skipped.
+MAX_BUCKET = 50
+BOILERPLATE_SELLERS = 10
+
+DEFAULT_THRESHOLD = 0.6
+DEFAULT_OUT = 'duplicates.json'
+
+# Listing fields shingles() and seller_of() use
+LISTING_FIELDS = ('id', 'title', 'description', 'userId')
+
+# Universal hashing (a * x + b) mod P over 32-bit shingle hashes, with P the
+# smallest prime above 2^32 and a, b uniform in [1, P). a * x can reach 2^65,
+# so it is computed in two halves of a (see minhash) to stay inside uint64.
+PRIME = 4294967311
+_rng = np.random.default_rng(20240527)
+PERM_A = _rng.integers(1, PRIME, NUM_PERM, dtype=np.uint64)
+PERM_B = _rng.integers(1, PRIME, NUM_PERM, dtype=np.uint64)
+PERM_A_HI = PERM_A >> np.uint64(16)
+PERM_A_LO = PERM_A & np.uint64(0xFFFF)
+BAND_MIX = _rng.integers(1, 1 << 63, ROWS, dtype=np.uint64) | np.uint64(1)
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def shingles(listing):
+    text = f"{listing.get('title') or ''} {listing.get('description') or ''}".lower()
+    words = WORD_RE.findall(text)
+    if len(words) < SHINGLE_SIZE:
+        grams = [' '.join(words)] if words else []
+    else:
+        grams = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64)
+
+
+def minhash(values):
+    """Signature of a non-empty array of shingle hashes."""
+    prime = np.uint64(PRIME)
+    x = values[None, :]
+    # a * x mod P as (a_hi * x mod P) * 2^16 + a_lo * x: every term stays below 2^50
+    hashed = ((PERM_A_HI[:, None] * x) % prime << np.uint64(16)) + PERM_A_LO[:, None] * x
+    hashed = (hashed + PERM_B[:, None]) % prime
+    # The 15 values in [2^32, P) share the top slot, which never matters for a minimum
+    return np.minimum(hashed.min(axis=1), np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def band_keys(signatures):
+    """One 64-bit key per band, mixing that band's rows (uint64 wraps on purpose)."""
+    rows = signatures.reshape(len(signatures), BANDS, ROWS).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        return (rows * BAND_MIX).sum(axis=2, dtype=np.uint64)
+
+
+def seller_of(listing):
+    seller = listing.get('seller') or {}
+    return listing.get('userId') or seller.get('id') or ''
+
+
+# ---------- Persisted index ----------
+
+def load_index():
+    version = None
+    if os.path.exists(VERSION_PATH):
+        with open(VERSION_PATH, 'r', encoding='utf-8') as f:
+            version = f.read().strip()
+    if version != str(INDEX_VERSION):
+        reset_index()
+    if not os.path.exists(IDS_PATH):
+        return [], np.zeros((0, NUM_PERM), np.uint32), np.zeros((0, BANDS), np.uint64)
+    with open(IDS_PATH, 'r', encoding='utf-8') as f:
+        meta = [json.loads(line) for line in f]
+    n = len(meta)
+    # Files can be longer than ids.ndjson if a run died mid-append, trust the ids
+    signatures = np.fromfile(SIGNATURES_PATH, dtype=np.uint32, count=n * NUM_PERM).reshape(n, NUM_PERM)
+    bands = np.fromfile(BANDS_PATH, dtype=np.uint64, count=n * BANDS).reshape(n, BANDS)
+    return meta, signatures, bands
+
+
+def reset_index():
+    for path in (IDS_PATH, SIGNATURES_PATH, BANDS_PATH, VERSION_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def append_index(start, meta, signatures, bands):
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    with open(VERSION_PATH, 'w', encoding='utf-8') as f:
+        f.write(f'{INDEX_VERSION}\n')
+    # Cut off rows from an append that never made it into ids.ndjson
+    for path, row_bytes in ((SIGNATURES_PATH, NUM_PERM * 4), (BANDS_PATH, BANDS * 8)):
+        if os.path.exists(path):
+            os.truncate(path, start * row_bytes)
+    with open(SIGNATURES_PATH, 'ab') as f:
+        signatures.tofile(f)
+    with open(BANDS_PATH, 'ab') as f:
+        bands.tofile(f)
+    # ids last, so a partial append is ignored on the next load
+    with open(IDS_PATH, 'a', encoding='utf-8') as f:
+        for entry in meta:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    count('bytes.written', signatures.nbytes + bands.nbytes)
+
+
+# ---------- Candidates ----------
+
+def candidate_pairs(bands, new_start, sellers):
+    """Row pairs sharing a band where at least one row is >= new_start.
+
+    Oversized buckets from few sellers are linked as a star around their first
+    member instead of every pair, which is enough for union-find to cluster them.
+    """
+    pairs = set()
+    oversized = 0
+    n = len(bands)
+    for band in range(BANDS):
+        column = bands[:, band]
+        order = np.argsort(column, kind='stable')
+        keys = column[order]
+        # Boundaries of runs of equal keys
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], n]
+        for s, e in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+            members = order[s:e]
+            if members.max() < new_start:
+                continue
+            if e - s > MAX_BUCKET:
+                if len({sellers[int(r)] for r in members}) > BOILERPLATE_SELLERS:
+                    oversized += 1
+                    continue
+                anchor = int(members.min())
+                for r in members:
+                    r = int(r)
+                    if r != anchor:
+                        pairs.add((anchor, r))
+                continue
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    a, b = int(members[i]), int(members[j])
+                    if a >= new_start or b >= new_start:
+                        pairs.add((min(a, b), max(a, b)))
+    return pairs, oversized
+
+
+def clusters_from(pairs, n):
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b, _ in pairs:
+        parent[find(a)] = find(b)
+
+    groups = {}
+    for a, b, similarity in pairs:
+        root = find(a)
+        group = groups.setdefault(root, {'rows': set(), 'similarity': 1.0})
+        group['rows'].update((a, b))
+        group['similarity'] = min(group['similarity'], similarity)
+    return list(groups.values())
+
+
+# ---------- Self-test ----------
+
+SELF_TEST_PAIRS = 400
+SELF_TEST_MEAN_ERROR = 0.05
+SELF_TEST_MAX_ERROR = 0.25
+
+
+def self_test():
+    """Compare estimated and exact Jaccard similarity on random shingle sets."""
+    rng = np.random.default_rng(7)
+    errors = []
+    for i in range(SELF_TEST_PAIRS):
+        size = int(rng.integers(5, 200))
+        shared = int(rng.integers(0, size + 1))
+        # Half the pairs use only small hashes, where a weak hash family stops permuting
+        high = (1 << 30) if i % 2 else (1 << 32)
+        universe = np.unique(rng.integers(0, high, 3 * size, dtype=np.uint64))
+        rng.shuffle(universe)
+        a = universe[:size]
+        b = np.concatenate([universe[:shared], universe[size:2 * size - shared]])
+        exact = len(np.intersect1d(a, b)) / len(np.union1d(a, b))
+        estimate = float(np.mean(minhash(a) == minhash(b)))
+        errors.append(abs(estimate - exact))
+
+    errors = np.array(errors)
+    ok = errors.mean() <= SELF_TEST_MEAN_ERROR and errors.max() <= SELF_TEST_MAX_ERROR
+    print(f"MinHash self-test on {SELF_TEST_PAIRS} pairs: mean error {errors.mean():.3f} "
+          f"(limit {SELF_TEST_MEAN_ERROR}), max error {errors.max():.3f} (limit {SELF_TEST_MAX_ERROR})")
+    print('OK' if ok else 'FAILED')
+    return ok
+
+
+# ---------- Main ----------
+
+def main():
+    parser = argparse.ArgumentParser(description='Find near-duplicate listings with MinHash/LSH.')
+    parser.add_argument('export', nargs='?', help='listings export (.ndjson/.jsonl or .json)')
+    parser.add_argument('--self-test', action='store_true',
+                        help='check MinHash estimates against exact Jaccard similarity and exit')
+    parser.add_argument('--incremental', action='store_true', help='only add listings missing from the index')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='minimum estimated Jaccard similarity to report')
+    parser.add_argument('--out', help=f'where to write the clusters (default {DEFAULT_OUT})')
+    args = parser.parse_args()
+
+    if args.self_test:
+        sys.exit(0 if self_test() else 1)
+    if not args.export:
+        parser.error('an export is required')
+
+    export = os.path.abspath(args.export)
+    out_path = os.path.abspath(args.out) if args.out else os.path.join(ROOT, DEFAULT_OUT)
+    os.chdir(ROOT)
+
+    with stage('dedupe.load'):
+        if not args.incremental:
+            reset_index()
+        meta, old_signatures, old_bands = load_index()
+        known = {entry['id'] for entry in meta}
+
+    new_meta = []
+    new_signatures = []
+    active = set()
+    empty = 0
+    with stage('dedupe.minhash'):
+        for listing in iter_listings(export, LISTING_FIELDS, active=True):
+            listing_id = listing.get('id')
+            active.add(listing_id)
+            if not listing_id or listing_id in known:
+                count('cache.hit')
+                continue
+            values = shingles(listing)
+            if values.size == 0:
+                empty += 1
+                continue
+            count('cache.miss')
+            known.add(listing_id)
+            new_meta.append({'id': listing_id, 'seller': seller_of(listing), 'title': listing.get('title') or ''})
+            new_signatures.append(minhash(values))
+
+    # Sold, removed or unpublished since they were indexed
+    keep = np.array([entry['id'] in active for entry in meta], dtype=bool)
+    dropped = len(meta) - int(keep.sum())
+    if dropped:
+        meta = [entry for entry, kept in zip(meta, keep) if kept]
+        old_signatures, old_bands = old_signatures[keep], old_bands[keep]
+    new_start = len(meta)
+
+    signatures = np.vstack([old_signatures] + new_signatures) if new_signatures else old_signatures
+    new_bands = band_keys(signatures[new_start:])
+    bands = np.vstack([old_bands, new_bands])
+    meta = meta + new_meta
+
+    with stage('dedupe.candidates'):
+        candidates, oversized = candidate_pairs(bands, new_start, [entry['seller'] for entry in meta])
+
+    with stage('dedupe.verify'):
+        verified = []
+        for a, b in candidates:
+            similarity = float(np.mean(signatures[a] == signatures[b]))
+            if similarity >= args.threshold:
+                verified.append((a, b, similarity))
+
+        clusters = []
+        for group in clusters_from(verified, len(meta)):
+            rows = sorted(group['rows'])
+            sellers = sorted({meta[r]['seller'] for r in rows})
+            clusters.append({
+                'kind': 'same-seller' if len(sellers) == 1 else 'cross-seller',
+                'similarity': round(group['similarity'], 3),
+                'sellers': sellers,
+                'listings': [{'id': meta[r]['id'], 'seller': meta[r]['seller'], 'title': meta[r]['title']}
+                             for r in rows],
+            })
+        # Spam first, then the tightest matches
+        clusters.sort(key=lambda c: (c['kind'] != 'cross-seller', -c['similarity'], -len(c['listings'])))
+
+    with stage('dedupe.write'):
+        if dropped:
+            reset_index()
+            append_index(0, meta, signatures, bands)
+        else:
+            append_index(new_start, new_meta, signatures[new_start:], new_bands)
+        write_text(out_path, json.dumps({'threshold': args.threshold, 'clusters': clusters}, indent=2) + '\n')
+
+    cross = sum(1 for c in clusters if c['kind'] == 'cross-seller')
+    print(f"Indexed {len(new_meta)} new listings ({len(meta)} in the index, {dropped} no longer active dropped)")
+    print(f"{len(candidates)} candidate pairs, {len(verified)} above {args.threshold:.2f} similarity")
+    print(f"Clusters: {len(clusters)} ({cross} cross-seller, {len(clusters) - cross} same-seller)")
+    for c in clusters[:10]:
+        ids = ', '.join(l['id'] for l in c['listings'])
+        print(f"  {c['kind']:<12} {c['similarity']:.2f}  {ids}")
+    if empty:
+        print(f"Skipped {empty} listings without any title or description words")
+    if oversized:
+        print(f"Skipped {oversized} boilerplate buckets (over {MAX_BUCKET} listings from more than "
+              f"{BOILERPLATE_SELLERS} sellers with identical text)")
+    print(f"Written to {os.path.relpath(out_path, ROOT)}")
+
+    finish('dedupe')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Content hashing with an on-disk stat cache
+# Shared by the build tools so unchanged files are never re-read.
+#
+# The cache lives in .build-cache/<name>.json and maps a path to
+# [size, mtime_ns, hash]. A file is only re-hashed when its size or
+# mtime changed since the last run.
+
+import hashlib
+import json
+import os
+
+from buildstats import count
+
+CACHE_DIR = '.build-cache'
+HASH_LENGTH = 16
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+            count('bytes.read', len(chunk))
+    return h.hexdigest()[:HASH_LENGTH]
+
+
+class HashCache:
+    def __init__(self, name, root='.'):
+        self.path = os.path.join(root, CACHE_DIR, name + '.json')
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def digest(self, path):
+        """Return the content hash of path, re-reading it only if it changed."""
+        st = os.stat(path)
+        key = path.replace(os.sep, '/')
+        cached = self.entries.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            count('cache.hit')
+            return cached[2]
+
+        count('cache.miss')
+        digest = hash_file(path)
+        self.entries[key] = [st.st_size, st.st_mtime_ns, digest]
+        self.dirty = True
+        return digest
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, separators=(',', ':'), sort_keys=True)
+        self.dirty = False
@@ -0,0 +1,543 @@
+# Firestore query analyzer
+#
+# Pulls every collection()/collectionGroup() chain (where, orderBy, limit, doc,
+# get, onSnapshot, ...) out of js/*.js and functions/**/*.js and:
+#   - writes firestore.indexes.json with the composite indexes the queries need
+#   - flags query reads with no limit()
+#   - flags N+1 reads (a get() inside a for/while/forEach/map body)
+#   - estimates document reads per page load from a collection-size model
+#
+# Chains are followed through a simple variable assignment
+# (const q = db.collection(...).limit(100); q.onSnapshot(...)), queries built
+# up conditionally across statements are not.
+#
+# Usage: python tools/firestore_queries.py [--model sizes.json] [--no-write]
+
+import argparse
+import glob
+import json
+import math
+import os
+import re
+
+from buildstats import finish, read_text, stage, write_text
+from precache import page_assets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCES = ['js/*.js', 'functions/**/*.js']
+PAGES = ['index.html', 'pages/**/*.html']
+INDEXES_PATH = 'firestore.indexes.json'
+
+# Collection sizes and filter selectivity used for read estimates.
+# Override any part of it with --model (same shape, merged over this).
+DEFAULT_MODEL = {
+    'collections': {
+        'users': 10000,
+        'listings': 50000,
+        'reports': 500,
+        'adminLogs': 100000,
+        'conversations': 20000,
+        'usage_tracking': 10000,
+        'system_settings': 5,
+        # Subcollections are sized per parent document
+        'favorites': 25,
+        'messages': 200,
+    },
+    # Collection group queries span every parent, size them separately
+    'collection_groups': {
+        'favorites': 250000,
+        'messages': 4000000,
+    },
+    'default_size': 1000,
+    'selectivity': {
+        'equality': 0.5,
+        'range': 0.2,
+        'array': 0.1,
+        # Most listings are active, few reports are pending
+        'listings.status': 0.9,
+        'reports.status': 0.3,
+    },
+    # Documents expected to match an equality filter on an *Id field
+    'id_matches': 10,
+    # Iterations assumed for a loop that no earlier query feeds
+    'loop_default': 10,
+}
+
+CHAIN_METHODS = {
+    'collection', 'collectionGroup', 'doc', 'where', 'orderBy', 'limit', 'limitToLast',
+    'startAt', 'startAfter', 'endAt', 'endBefore', 'select', 'offset',
+    'get', 'onSnapshot', 'add', 'set', 'update', 'delete',
+}
+READ_TERMINALS = {'get', 'onSnapshot'}
+WRITE_TERMINALS = {'add', 'set', 'update', 'delete'}
+
+EQUALITY_OPS = {'==', 'in'}
+ARRAY_OPS = {'array-contains', 'array-contains-any'}
+INEQUALITY_OPS = {'<', '<=', '>', '>=', '!=', 'not-in'}
+
+CHAIN_START_RE = re.compile(r'\.\s*(?:collection|collectionGroup)\s*\(')
+CALL_RE = re.compile(r'\s*\.\s*([A-Za-z_$][\w$]*)\s*\(')
+LOOP_RE = re.compile(r'\b(?:for|while)\s*\(|\.\s*(?:forEach|map)\s*\(')
+ASSIGN_RE = re.compile(r'(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:await\s+)?[^=]*$')
+STRING_RE = re.compile(r'^([\'"`])(.*)\1$', re.S)
+
+CLOSERS = {'(': ')', '[': ']', '{': '}'}
+
+
+# ---------- Source scanning ----------
+
+def mask_source(src):
+    """Blank out comments and string contents, keeping offsets and newlines.
+
+    Bracket matching runs on the masked text, literal values are read back
+    from the original at the same offsets.
+    """
+    out = list(src)
+    n = len(src)
+
+    def blank(start, end):
+        for k in range(start, min(end, n)):
+            if out[k] != '\n':
+                out[k] = ' '
+
+    i = 0
+    while i < n:
+        c = src[i]
+        if c in '\'"`':
+            j = i + 1
+            while j < n and src[j] != c:
+                if src[j] == '\\':
+                    j += 1
+                j += 1
+            blank(i + 1, j)
+            i = j + 1
+        elif src.startswith('//', i):
+            j = src.find('\n', i)
+            j = n if j < 0 else j
+            blank(i, j)
+            i = j
+        elif src.startswith('/*', i):
+            j = src.find('*/', i + 2)
+            j = n if j < 0 else j + 2
+            blank(i, j)
+            i = j
+        else:
+            i += 1
+    return ''.join(out)
+
+
+def match_bracket(masked, open_pos):
+    """Return the offset of the bracket closing the one at open_pos."""
+    stack = []
+    for i in range(open_pos, len(masked)):
+        c = masked[i]
+        if c in CLOSERS:
+            stack.append(CLOSERS[c])
+        elif stack and c == stack[-1]:
+            stack.pop()
+            if not stack:
+                return i
+    return len(masked) - 1
+
+
+def split_args(masked, src, start, end):
+    args = []
+    depth = 0
+    arg_start = start
+    for i in range(start, end):
+        c = masked[i]
+        if c in CLOSERS:
+            depth += 1
+        elif c in ')]}':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            args.append(src[arg_start:i].strip())
+            arg_start = i + 1
+    last = src[arg_start:end].strip()
+    if last:
+        args.append(last)
+    return [literal(a) for a in args]
+
+
+def literal(arg):
+    m = STRING_RE.match(arg)
+    if m:
+        return m.group(2)
+    if re.fullmatch(r'\d+', arg):
+        return int(arg)
+    return {'expr': arg}
+
+
+def line_of(src, pos):
+    return src.count('\n', 0, pos) + 1
+
+
+def parse_calls(masked, src, pos):
+    """Parse .method(args) calls starting at pos until the chain ends."""
+    calls = []
+    i = pos
+    while True:
+        m = CALL_RE.match(masked, i)
+        if not m or m.group(1) not in CHAIN_METHODS:
+            break
+        open_pos = m.end() - 1
+        close = match_bracket(masked, open_pos)
+        calls.append((m.group(1), split_args(masked, src, open_pos + 1, close)))
+        i = close + 1
+        if m.group(1) in READ_TERMINALS | WRITE_TERMINALS:
+            break
+    return calls, i
+
+
+def assigned_name(masked, pos):
+    """Name of the variable a chain starting at pos is assigned to, if any."""
+    stmt_start = max(masked.rfind(c, 0, pos) for c in ';{}') + 1
+    m = ASSIGN_RE.search(masked[stmt_start:pos])
+    return m.group(1) if m else None
+
+
+def loop_spans(masked, src):
+    spans = []
+    for m in LOOP_RE.finditer(masked):
+        open_pos = m.end() - 1
+        close = match_bracket(masked, open_pos)
+        if m.group(0).lstrip('.').lstrip().startswith(('forEach', 'map')):
+            start, end = open_pos, close
+        else:
+            body = close + 1
+            while body < len(masked) and masked[body].isspace():
+                body += 1
+            if body < len(masked) and masked[body] == '{':
+                start, end = body, match_bracket(masked, body)
+            else:
+                start, end = body, masked.find(';', body)
+        spans.append((start, end, line_of(src, m.start())))
+    return spans
+
+
+# ---------- Chain model ----------
+
+def build_chain(path, src, calls, pos):
+    segments = []
+    group = False
+    filters = []
+    order = []
+    limit = None
+    terminal = None
+
+    for name, args in calls:
+        first = args[0] if args else None
+        if name in ('collection', 'collectionGroup'):
+            segments.append(first if isinstance(first, str) else '?')
+            group = group or name == 'collectionGroup'
+        elif name == 'doc':
+            segments.append('{id}')
+        elif name == 'where' and len(args) >= 2:
+            field = first if isinstance(first, str) else first['expr']
+            op = args[1] if isinstance(args[1], str) else '?'
+            filters.append((field, op))
+        elif name == 'orderBy' and args:
+            field = first if isinstance(first, str) else first['expr']
+            direction = args[1] if len(args) > 1 and isinstance(args[1], str) else 'asc'
+            order.append((field, direction.lower()))
+        elif name in ('limit', 'limitToLast') and args:
+            limit = first if isinstance(first, int) else first.get('expr', True)
+        elif name in READ_TERMINALS | WRITE_TERMINALS:
+            terminal = name
+
+    collection = next((s for s in reversed(segments) if s != '{id}'), '?')
+    return {
+        'file': path,
+        'line': line_of(src, pos),
+        'offset': pos,
+        'path': '/'.join(segments),
+        'collection': collection,
+        'group': group,
+        'kind': 'doc' if segments and segments[-1] == '{id}' else 'query',
+        'filters': filters,
+        'order': order,
+        'limit': limit,
+        'terminal': terminal,
+        'loop_line': None,
+    }
+
+
+def scan_file(path):
+    src = read_text(path)
+    masked = mask_source(src)
+    loops = loop_spans(masked, src)
+
+    chains = []
+    consumed = 0
+    for m in CHAIN_START_RE.finditer(masked):
+        if m.start() < consumed:
+            # A nested .collection() of a chain already parsed
+            continue
+        calls, end = parse_calls(masked, src, m.start())
+        consumed = end
+        chain = build_chain(path, src, calls, m.start())
+
+        if chain['terminal'] is None:
+            # const q = db.collection(...).limit(100); ... q.onSnapshot(...)
+            name = assigned_name(masked, m.start())
+            if name:
+                use = re.search(r'\b' + re.escape(name) + r'\s*\.\s*(get|onSnapshot)\s*\(', masked[end:])
+                if use:
+                    chain['terminal'] = use.group(1)
+
+        # Innermost loop wins so the reported line is the one doing the iterating
+        inside = [l for l in loops if l[0] < m.start() < l[1]]
+        if inside:
+            chain['loop_line'] = max(inside, key=lambda l: l[0])[2]
+            chain['loop_start'] = max(l[0] for l in inside)
+        chains.append(chain)
+    return chains
+
+
+def is_read(chain):
+    return chain['terminal'] in READ_TERMINALS
+
+
+# ---------- Index generation ----------
+
+def composite_index(chain):
+    """Return the composite index a query needs, or None if single-field indexes do."""
+    if chain['kind'] != 'query':
+        return None
+
+    equality = [f for f, op in chain['filters'] if op in EQUALITY_OPS]
+    arrays = [f for f, op in chain['filters'] if op in ARRAY_OPS]
+    ranges = [f for f, op in chain['filters'] if op in INEQUALITY_OPS]
+    fields = set(equality) | set(arrays) | set(ranges) | {f for f, _ in chain['order']}
+
+    # Equality-only queries are served by merging single-field indexes
+    if len(fields) < 2 or not (ranges or chain['order']):
+        return None
+
+    entries = []
+    seen = set()
+
+    def add(field, **config):
+        if field not in seen:
+            seen.add(field)
+            entries.append(dict(fieldPath=field, **config))
+
+    for field in equality:
+        add(field, order='ASCENDING')
+    for field in arrays:
+        add(field, arrayConfig='CONTAINS')
+
+    # The inequality field must come first in the sort order
+    directions = dict(chain['order'])
+    for field in ranges:
+        add(field, order='DESCENDING' if directions.get(field) == 'desc' else 'ASCENDING')
+    for field, direction in chain['order']:
+        add(field, order='DESCENDING' if direction == 'desc' else 'ASCENDING')
+
+    return {
+        'collectionGroup': chain['collection'],
+        'queryScope': 'COLLECTION_GROUP' if chain['group'] else 'COLLECTION',
+        'fields': entries,
+    }
+
+
+def field_override(chain):
+    """Collection group queries on one field need a COLLECTION_GROUP single-field index."""
+    if not chain['group'] or composite_index(chain) or not chain['filters']:
+        return None
+    return {
+        'collectionGroup': chain['collection'],
+        'fieldPath': chain['filters'][0][0],
+        'indexes': [
+            {'order': 'ASCENDING', 'queryScope': 'COLLECTION'},
+            {'order': 'DESCENDING', 'queryScope': 'COLLECTION'},
+            {'arrayConfig': 'CONTAINS', 'queryScope': 'COLLECTION'},
+            {'order': 'ASCENDING', 'queryScope': 'COLLECTION_GROUP'},
+        ],
+    }
+
+
+def build_indexes(chains, existing):
+    indexes = list(existing.get('indexes', []))
+    overrides = list(existing.get('fieldOverrides', []))
+    keys = {json.dumps(i, sort_keys=True) for i in indexes}
+    override_keys = {(o['collectionGroup'], o['fieldPath']) for o in overrides}
+
+    for chain in chains:
+        if not is_read(chain):
+            continue
+        index = composite_index(chain)
+        if index and json.dumps(index, sort_keys=True) not in keys:
+            keys.add(json.dumps(index, sort_keys=True))
+            indexes.append(index)
+        override = field_override(chain)
+        if override and (override['collectionGroup'], override['fieldPath']) not in override_keys:
+            override_keys.add((override['collectionGroup'], override['fieldPath']))
+            overrides.append(override)
+
+    return {'indexes': indexes, 'fieldOverrides': overrides}
+
+
+# ---------- Read estimates ----------
+
+def load_model(path):
+    model = json.loads(json.dumps(DEFAULT_MODEL))
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            custom = json.load(f)
+        for key, value in custom.items():
+            if isinstance(value, dict):
+                model[key].update(value)
+            else:
+                model[key] = value
+    return model
+
+
+def estimate_docs(chain, model):
+    """Documents returned (and billed) by one execution of a read."""
+    if chain['kind'] == 'doc':
+        return 1
+
+    name = chain['collection']
+    sizes = model['collection_groups'] if chain['group'] else model['collections']
+    docs = sizes.get(name, model['default_size'])
+
+    selectivity = model['selectivity']
+    for field, op in chain['filters']:
+        key = f'{name}.{field}'
+        if key in selectivity:
+            docs *= selectivity[key]
+        elif op in EQUALITY_OPS and field.endswith(('Id', 'id')):
+            docs = min(docs, model['id_matches'])
+        elif op in EQUALITY_OPS:
+            docs *= selectivity['equality']
+        elif op in ARRAY_OPS:
+            docs *= selectivity['array']
+        else:
+            docs *= selectivity['range']
+
+    if isinstance(chain['limit'], int):
+        docs = min(docs, chain['limit'])
+    # An empty result still costs one read
+    return max(1, math.ceil(docs))
+
+
+def loop_iterations(chain, chains, model):
+    """Iterations of the loop around chain, taken from the query feeding it."""
+    feeders = [c for c in chains
+               if c['file'] == chain['file'] and is_read(c) and c['kind'] == 'query'
+               and c['offset'] < chain['loop_start'] and c['loop_line'] is None]
+    if not feeders:
+        return model['loop_default']
+    return estimate_docs(feeders[-1], model)
+
+
+def estimate_reads(chain, chains, model):
+    docs = estimate_docs(chain, model)
+    if chain['loop_line'] is not None:
+        docs *= loop_iterations(chain, chains, model)
+    return docs
+
+
+def reads_by_file(chains, model):
+    totals = {}
+    for chain in chains:
+        if is_read(chain):
+            totals[chain['file']] = totals.get(chain['file'], 0) + estimate_reads(chain, chains, model)
+    return totals
+
+
+def reads_by_page(file_totals):
+    pages = sorted({p.replace(os.sep, '/') for pattern in PAGES for p in glob.glob(pattern, recursive=True)})
+    totals = {}
+    for page in pages:
+        reads = sum(file_totals.get(asset, 0) for asset in page_assets(page))
+        if reads:
+            totals[page] = reads
+    return totals
+
+
+# ---------- Report ----------
+
+def describe(chain):
+    parts = [chain['path']]
+    parts += [f'{field} {op}' for field, op in chain['filters']]
+    parts += [f'orderBy {field} {direction}' for field, direction in chain['order']]
+    if chain['group']:
+        parts[0] = f'group({chain["collection"]})'
+    return ', '.join(parts)
+
+
+def location(chain):
+    return f"{chain['file']}:{chain['line']}"
+
+
+def print_report(chains, model, index_count, override_count, wrote):
+    reads = [c for c in chains if is_read(c)]
+    writes = [c for c in chains if c['terminal'] in WRITE_TERMINALS]
+    files = {c['file'] for c in chains}
+    print(f"Firestore: {len(chains)} query chains in {len(files)} files "
+          f"({len(reads)} reads, {len(writes)} writes)")
+
+    unbounded = [c for c in reads if c['kind'] == 'query' and c['limit'] is None]
+    print('')
+    print(f'Unbounded reads (no limit): {len(unbounded)}')
+    for c in unbounded:
+        print(f"  {location(c):<28} {describe(c):<60} ~{estimate_docs(c, model):,} docs")
+
+    looped = [c for c in reads if c['loop_line'] is not None]
+    print('')
+    print(f'N+1 reads inside loops: {len(looped)}')
+    for c in looped:
+        iterations = loop_iterations(c, chains, model)
+        print(f"  {location(c):<28} {describe(c):<60} x{iterations:,} (loop at line {c['loop_line']})")
+
+    file_totals = reads_by_file(chains, model)
+    print('')
+    print('Estimated document reads per page load (upper bound, every read in the loaded scripts):')
+    for page, total in sorted(reads_by_page(file_totals).items(), key=lambda kv: -kv[1]):
+        print(f'  {page:<40} {total:>12,}')
+
+    functions = {f: t for f, t in file_totals.items() if f.startswith('functions/')}
+    if functions:
+        print('')
+        print('Estimated document reads per Cloud Functions file (all triggers once):')
+        for path, total in sorted(functions.items()):
+            print(f'  {path:<40} {total:>12,}')
+
+    print('')
+    action = f'written to {INDEXES_PATH}' if wrote else 'not written (--no-write)'
+    print(f'Indexes: {index_count} composite, {override_count} field overrides, {action}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyze Firestore queries in the client and functions code.')
+    parser.add_argument('--model', help='JSON file overriding the collection-size model')
+    parser.add_argument('--no-write', action='store_true', help=f'do not write {INDEXES_PATH}')
+    args = parser.parse_args()
+
+    model = load_model(os.path.abspath(args.model) if args.model else None)
+    os.chdir(ROOT)
+
+    with stage('queries.scan'):
+        sources = sorted({p.replace(os.sep, '/') for pattern in SOURCES
+                          for p in glob.glob(pattern, recursive=True) if 'node_modules' not in p})
+        chains = []
+        for path in sources:
+            chains.extend(scan_file(path))
+
+    with stage('queries.indexes'):
+        existing = json.loads(read_text(INDEXES_PATH)) if os.path.exists(INDEXES_PATH) else {}
+        indexes = build_indexes(chains, existing)
+        if not args.no_write:
+            write_text(INDEXES_PATH, json.dumps(indexes, indent=2) + '\n')
+
+    with stage('queries.estimate'):
+        print_report(chains, model, len(indexes['indexes']), len(indexes['fieldOverrides']), not args.no_write)
+
+    finish('firestore-queries')
+
+
+if __name__ == '__main__':
+    main()
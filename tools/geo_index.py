@@ -0,0 +1,304 @@
+# Geohash index for "Find Deals Near You" radius queries
+#
+# build: assigns every active listing with location.lat/lng to geohash cells
+#   and writes
+#     data/geo/index.json            cells and listing counts per precision
+#     data/geo/<p>/<cell>.json       listing shards for the client (p = 4, 5)
+#     .build-cache/geo/index.npz     sorted geohash codes for offline queries
+#   From a listing store only the SHARD_FIELDS columns of active rows are read.
+#
+# query: answers radius queries from the offline index. A radius only needs
+#   the handful of cells covering the circle's bounding box. Because geohash
+#   cells are prefixes, each cell is one contiguous range of the sorted codes,
+#   so candidates come from searchsorted and survivors from an exact haversine,
+#   both vectorized across a whole batch of queries.
+#
+# Usage: python tools/geo_index.py build <export>
+#        python tools/geo_index.py query --lat 43.65 --lng -79.38 --radius 25
+#        python tools/geo_index.py query --batch queries.csv   (lat,lng,radius_km per line)
+
+import argparse
+import json
+import os
+import shutil
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    sys.exit('NumPy is required: pip install -r tools/requirements.txt')
+
+from buildstats import count, finish, stage, write_text
+from filehash import CACHE_DIR
+from listings_export import iter_listings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Codes are stored at MAX_PRECISION, coarser cells are right shifts of it
+MAX_PRECISION = 6
+SHARD_PRECISIONS = (4, 5)
+
+# A query uses the finest precision whose cover stays within this many cells
+MAX_COVER_CELLS = 9
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+OUTPUT_DIR = os.path.join('data', 'geo')
+INDEX_PATH = os.path.join(CACHE_DIR, 'geo', 'index.npz')
+
+# Listing fields shard_record() uses, all a listing store has as columns
+SHARD_FIELDS = ('id', 'title', 'price', 'category', 'location', 'images')
+
+
+# ---------- Geohash ----------
+
+def bit_split(precision):
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2   # longitude bits, latitude bits
+
+
+def cell_indexes(lat, lng, precision):
+    lng_bits, lat_bits = bit_split(precision)
+    lat_idx = np.floor((np.asarray(lat, float) + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64)
+    lng_idx = np.floor((np.asarray(lng, float) + 180.0) / 360.0 * (1 << lng_bits)).astype(np.int64)
+    return np.clip(lat_idx, 0, (1 << lat_bits) - 1), np.clip(lng_idx, 0, (1 << lng_bits) - 1)
+
+
+def interleave(lat_idx, lng_idx, precision):
+    """Geohash integer from cell indexes, longitude bit first."""
+    lng_bits, lat_bits = bit_split(precision)
+    lat_idx = np.asarray(lat_idx, np.uint64)
+    lng_idx = np.asarray(lng_idx, np.uint64)
+    code = np.zeros(np.broadcast(lat_idx, lng_idx).shape, np.uint64)
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            bit = (lng_idx >> np.uint64(lng_bits - 1 - i // 2)) & np.uint64(1)
+        else:
+            bit = (lat_idx >> np.uint64(lat_bits - 1 - i // 2)) & np.uint64(1)
+        code = (code << np.uint64(1)) | bit
+    return code
+
+
+def encode(lat, lng, precision=MAX_PRECISION):
+    return interleave(*cell_indexes(lat, lng, precision), precision)
+
+
+def to_string(code, precision):
+    code = int(code)
+    return ''.join(BASE32[(code >> (5 * (precision - 1 - i))) & 31] for i in range(precision))
+
+
+def coarsen(codes, precision):
+    return codes >> np.uint64(5 * (MAX_PRECISION - precision))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = (np.radians(a) for a in (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# ---------- Covering cells ----------
+
+def cover(lat, lng, radius_km):
+    """(precision, codes) of the cells covering the circle's bounding box."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(np.cos(np.radians(lat)), 0.01))
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+
+    for precision in range(MAX_PRECISION, 0, -1):
+        lng_bits, lat_bits = bit_split(precision)
+        lat_lo, _ = cell_indexes(south, lng, precision)
+        lat_hi, _ = cell_indexes(north, lng, precision)
+        # Longitude edges are not clipped, either one may run past the antimeridian
+        # and the cells in between wrap around it
+        lng_lo = int(np.floor((lng - dlng + 180.0) / 360.0 * (1 << lng_bits)))
+        lng_hi = int(np.floor((lng + dlng + 180.0) / 360.0 * (1 << lng_bits)))
+        lng_cells = min(lng_hi - lng_lo + 1, 1 << lng_bits)
+        lat_cells = int(lat_hi) - int(lat_lo) + 1
+        if lat_cells * lng_cells <= MAX_COVER_CELLS or precision == 1:
+            lat_range = np.arange(int(lat_lo), int(lat_hi) + 1)
+            lng_range = (lng_lo + np.arange(lng_cells)) % (1 << lng_bits)
+            lat_grid, lng_grid = np.meshgrid(lat_range, lng_range, indexing='ij')
+            return precision, np.unique(interleave(lat_grid.ravel(), lng_grid.ravel(), precision))
+
+
+class GeoIndex:
+    def __init__(self, codes, lat, lng, ids):
+        self.codes = codes
+        self.lat = lat
+        self.lng = lng
+        self.ids = ids
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        data = np.load(path)
+        return cls(data['codes'], data['lat'], data['lng'], data['ids'])
+
+    def save(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, codes=self.codes, lat=self.lat, lng=self.lng, ids=self.ids)
+
+    def query_batch(self, lats, lngs, radii):
+        """Listing rows within radius of each center, as a list of (rows, distances_km)."""
+        starts, ends, owners = [], [], []
+        for q, (lat, lng, radius) in enumerate(zip(lats, lngs, radii)):
+            precision, cells = cover(lat, lng, radius)
+            shift = np.uint64(5 * (MAX_PRECISION - precision))
+            # Each cell is one contiguous run of the sorted full-precision codes
+            starts.append(np.searchsorted(self.codes, cells << shift, side='left'))
+            ends.append(np.searchsorted(self.codes, (cells + np.uint64(1)) << shift, side='left'))
+            owners.append(np.full(len(cells), q))
+
+        starts = np.concatenate(starts)
+        ends = np.concatenate(ends)
+        owners = np.concatenate(owners)
+        lengths = ends - starts
+
+        # Flatten every [start, end) range into candidate rows tagged with their query
+        query_of = np.repeat(owners, lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        rows = np.repeat(starts, lengths) + offsets
+        count('geo.candidates', len(rows))
+
+        lats = np.asarray(lats, float)
+        lngs = np.asarray(lngs, float)
+        distances = haversine_km(lats[query_of], lngs[query_of], self.lat[rows], self.lng[rows])
+        keep = distances <= np.asarray(radii, float)[query_of]
+
+        query_of, rows, distances = query_of[keep], rows[keep], distances[keep]
+        order = np.lexsort((distances, query_of))
+        query_of, rows, distances = query_of[order], rows[order], distances[order]
+        bounds = np.searchsorted(query_of, np.arange(len(lats) + 1))
+        return [(rows[bounds[q]:bounds[q + 1]], distances[bounds[q]:bounds[q + 1]]) for q in range(len(lats))]
+
+    def query(self, lat, lng, radius_km):
+        return self.query_batch([lat], [lng], [radius_km])[0]
+
+
+# ---------- Build ----------
+
+def shard_record(listing):
+    location = listing['location']
+    images = listing.get('images') or []
+    return {
+        'id': listing['id'],
+        'title': listing.get('title') or '',
+        'price': listing.get('price'),
+        'category': listing.get('category'),
+        'city': location.get('city'),
+        'province': location.get('province'),
+        'lat': round(float(location['lat']), 5),
+        'lng': round(float(location['lng']), 5),
+        'image': images[0] if images and isinstance(images[0], str) else None,
+    }
+
+
+def has_location(listing):
+    location = listing.get('location') or {}
+    try:
+        return -90 <= float(location['lat']) <= 90 and -180 <= float(location['lng']) <= 180
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def build(export):
+    with stage('geo.load'):
+        records = []
+        skipped = 0
+        for listing in iter_listings(export, SHARD_FIELDS, active=True):
+            if not listing.get('id'):
+                continue
+            if not has_location(listing):
+                skipped += 1
+                continue
+            records.append(shard_record(listing))
+
+    with stage('geo.encode'):
+        lat = np.array([r['lat'] for r in records], float)
+        lng = np.array([r['lng'] for r in records], float)
+        codes = encode(lat, lng)
+        order = np.argsort(codes, kind='stable')
+        codes, lat, lng = codes[order], lat[order], lng[order]
+        records = [records[i] for i in order]
+        ids = np.array([r['id'] for r in records], dtype=str)
+        GeoIndex(codes, lat, lng, ids).save()
+
+    with stage('geo.shards'):
+        if os.path.isdir(OUTPUT_DIR):
+            shutil.rmtree(OUTPUT_DIR)
+        summary = {'precisions': list(SHARD_PRECISIONS), 'cells': {}}
+        for precision in SHARD_PRECISIONS:
+            folder = os.path.join(OUTPUT_DIR, str(precision))
+            os.makedirs(folder, exist_ok=True)
+            cells = coarsen(codes, precision)
+            # Sorted codes keep every cell contiguous at every precision
+            # (no boundaries at all when nothing was indexed)
+            boundaries = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1], True]) if len(cells) else []
+            counts = {}
+            for start, end in zip(boundaries[:-1], boundaries[1:]):
+                name = to_string(cells[start], precision)
+                counts[name] = int(end - start)
+                write_text(os.path.join(folder, f'{name}.json'),
+                           json.dumps(records[start:end], ensure_ascii=False, separators=(',', ':')))
+            summary['cells'][str(precision)] = counts
+        write_text(os.path.join(OUTPUT_DIR, 'index.json'), json.dumps(summary, separators=(',', ':')))
+
+    shard_counts = ', '.join(f"{len(summary['cells'][str(p)])} cells at precision {p}" for p in SHARD_PRECISIONS)
+    print(f"Indexed {len(records)} listings ({skipped} without a usable location): {shard_counts}")
+    print(f"Shards written to {OUTPUT_DIR}/, offline index to {INDEX_PATH}")
+
+
+def run_queries(args):
+    if args.batch:
+        centers = np.loadtxt(args.batch, delimiter=',', ndmin=2)
+        lats, lngs, radii = centers[:, 0], centers[:, 1], centers[:, 2]
+    elif args.lat is not None and args.lng is not None:
+        lats, lngs, radii = [args.lat], [args.lng], [args.radius]
+    else:
+        sys.exit('query needs --lat and --lng, or --batch')
+
+    with stage('geo.query'):
+        index = GeoIndex.load()
+        results = index.query_batch(lats, lngs, radii)
+
+    for lat, lng, radius, (rows, distances) in zip(lats, lngs, radii, results):
+        print(f"{len(rows)} listings within {radius:g} km of ({lat:.4f}, {lng:.4f})")
+        for row, distance in list(zip(rows, distances))[:args.show]:
+            print(f"  {index.ids[row]:<24} {distance:8.2f} km")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Geohash index for radius queries over listings.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_cmd = commands.add_parser('build', help='index a listings export')
+    build_cmd.add_argument('export', help='listings export (.ndjson/.jsonl or .json)')
+
+    query_cmd = commands.add_parser('query', help='radius query against the built index')
+    query_cmd.add_argument('--lat', type=float)
+    query_cmd.add_argument('--lng', type=float)
+    query_cmd.add_argument('--radius', type=float, default=25.0, help='radius in km')
+    query_cmd.add_argument('--batch', help='CSV of lat,lng,radius_km rows')
+    query_cmd.add_argument('--show', type=int, default=10, help='results to print per query')
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        export = os.path.abspath(args.export)
+        os.chdir(ROOT)
+        build(export)
+    else:
+        if args.batch:
+            args.batch = os.path.abspath(args.batch)
+        os.chdir(ROOT)
+        run_queries(args)
+
+    finish('geo-index')
+
+
+if __name__ == '__main__':
+    main()
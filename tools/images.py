@@ -0,0 +1,241 @@
+# Listing photo pipeline
+#
+# Processes a local directory standing in for Firebase Storage, laid out like
+# the bucket: <source>/<listingId>/<photo>. For every photo it:
+#   - writes thumb / card / detail sizes as WebP, across a process pool
+#   - strips EXIF (GPS included) by re-encoding without metadata, after
+#     applying the EXIF orientation so nothing ends up sideways
+#   - computes a 64-bit difference hash (dHash) to catch re-uploaded photos
+#   - computes a blur-up placeholder and dominant colour (tools/placeholders.py)
+#     so cards can paint something the right shape and colour immediately
+#
+# Outputs are content-addressed (<out>/<hash>-<size>.webp), so a photo that
+# has not changed, or was uploaded twice, is only processed once. The manifest
+# (<out>/manifest.json) tells the client which file to request for each size.
+#
+# Usage: python tools/images.py [--source storage/listings] [--out storage/resized]
+#            [--workers N] [--threshold 6]
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    sys.exit('Pillow is required: pip install -r tools/requirements.txt')
+
+from buildstats import count, finish, stage, write_text
+from filehash import CACHE_DIR, HashCache
+from placeholders import dominant_color, placeholder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Longest edge in pixels for each output size
+SIZES = {
+    'thumb': 160,
+    'card': 480,
+    'detail': 1200,
+}
+FORMAT = 'WEBP'
+EXTENSION = '.webp'
+QUALITY = 80
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.heic', '.gif', '.bmp', '.tif', '.tiff')
+
+# Hamming distance at or below which two photos count as the same picture
+DEFAULT_THRESHOLD = 6
+
+# dHash bits are split into bands for candidate lookup. Two hashes within
+# distance d < BANDS share at least one identical band (pigeonhole).
+BANDS = 8
+BAND_BITS = 64 // BANDS
+
+STATE_PATH = os.path.join(CACHE_DIR, 'images-state.json')
+DEFAULT_SOURCE = os.path.join('storage', 'listings')
+DEFAULT_OUT = os.path.join('storage', 'resized')
+
+
+def dhash(img):
+    """64-bit difference hash: compares neighbouring pixels of a 9x8 greyscale."""
+    small = img.convert('L').resize((9, 8), Image.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def output_path(out_dir, digest, size):
+    return os.path.join(out_dir, f'{digest}-{size}{EXTENSION}')
+
+
+def process_image(path, digest, out_dir):
+    """Resize one photo to every size. Runs in a worker process."""
+    written = 0
+    with Image.open(path) as img:
+        # Bake the EXIF rotation into the pixels, the metadata is dropped on save
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        width, height = img.size
+        phash = dhash(img)
+        preview = placeholder(img)
+        color = dominant_color(img)
+
+        for size, edge in SIZES.items():
+            target = output_path(out_dir, digest, size)
+            if os.path.exists(target):
+                continue
+            resized = img.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+            # No exif= / icc_profile= arguments, so no metadata is written
+            resized.save(target, FORMAT, quality=QUALITY, method=4)
+            written += os.path.getsize(target)
+
+    return {'phash': f'{phash:016x}', 'width': width, 'height': height,
+            'placeholder': preview, 'color': color, 'written': written}
+
+
+def find_photos(source):
+    photos = []
+    for listing_id in sorted(os.listdir(source)):
+        folder = os.path.join(source, listing_id)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                photos.append((f'{listing_id}/{name}', os.path.join(folder, name)))
+    return photos
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def find_duplicates(images, threshold):
+    """Pairs of photos whose dHashes are within threshold bits of each other."""
+    buckets = {}
+    hashes = {}
+    for key, info in images.items():
+        value = int(info['phash'], 16)
+        hashes[key] = value
+        for band in range(BANDS):
+            bits = (value >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1)
+            buckets.setdefault((band, bits), []).append(key)
+
+    pairs = {}
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if (a, b) in pairs:
+                    continue
+                distance = hamming(hashes[a], hashes[b])
+                if distance <= threshold:
+                    pairs[(a, b)] = distance
+    return [{'a': a, 'b': b, 'distance': d, 'crossListing': a.split('/')[0] != b.split('/')[0]}
+            for (a, b), d in sorted(pairs.items())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resize, strip and dedupe listing photos.')
+    parser.add_argument('--source', help=f'directory laid out as <listingId>/<photo> (default {DEFAULT_SOURCE})')
+    parser.add_argument('--out', help=f'output directory for sizes and manifest (default {DEFAULT_OUT})')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD,
+                        help=f'max dHash distance for a duplicate (below {BANDS})')
+    args = parser.parse_args()
+
+    source = os.path.abspath(args.source) if args.source else os.path.join(ROOT, DEFAULT_SOURCE)
+    out_dir = os.path.abspath(args.out) if args.out else os.path.join(ROOT, DEFAULT_OUT)
+    os.chdir(ROOT)
+    os.makedirs(out_dir, exist_ok=True)
+    threshold = min(args.threshold, BANDS - 1)
+
+    # Per content hash: phash, placeholder and original dimensions from earlier runs
+    known = {}
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH, 'r', encoding='utf-8') as f:
+            known = json.load(f)
+
+    hashes = HashCache('images')
+    with stage('images.scan'):
+        photos = find_photos(source)
+        digests = {key: hashes.digest(path) for key, path in photos}
+        hashes.save()
+
+    # One job per distinct content hash that is missing a size
+    jobs = {}
+    with stage('images.plan'):
+        for key, path in photos:
+            digest = digests[key]
+            if digest in jobs:
+                continue
+            complete = (digest in known and 'placeholder' in known[digest]
+                        and all(os.path.exists(output_path(out_dir, digest, s)) for s in SIZES))
+            if complete:
+                count('cache.hit')
+            else:
+                count('cache.miss')
+                jobs[digest] = path
+
+    failed = []
+    with stage('images.resize'):
+        if jobs:
+            with ProcessPoolExecutor(max(1, args.workers)) as pool:
+                futures = {digest: pool.submit(process_image, path, digest, out_dir)
+                           for digest, path in jobs.items()}
+                for digest, future in futures.items():
+                    try:
+                        result = future.result()
+                    except Exception as error:
+                        failed.append((jobs[digest], error))
+                        continue
+                    count('bytes.written', result.pop('written'))
+                    known[digest] = result
+
+    with stage('images.manifest'):
+        images = {}
+        for key, _ in photos:
+            digest = digests[key]
+            if digest not in known:
+                continue
+            entry = dict(known[digest], hash=digest)
+            for size in SIZES:
+                entry[size] = os.path.basename(output_path(out_dir, digest, size))
+            images[key] = entry
+
+        duplicates = find_duplicates(images, threshold)
+        manifest = {'sizes': SIZES, 'format': FORMAT.lower(), 'images': images, 'duplicates': duplicates}
+        write_text(os.path.join(out_dir, 'manifest.json'), json.dumps(manifest, indent=2) + '\n')
+
+        # Drop sizes of photos that were deleted or replaced
+        live = set(digests.values())
+        for name in os.listdir(out_dir):
+            if name.endswith(EXTENSION) and name.split('-')[0] not in live:
+                os.remove(os.path.join(out_dir, name))
+        known = {digest: info for digest, info in known.items() if digest in live}
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        write_text(STATE_PATH, json.dumps(known, separators=(',', ':')))
+
+    reposts = [d for d in duplicates if d['crossListing']]
+    print(f"Processed {len(jobs) - len(failed)} new photos, {len(photos)} photos total "
+          f"({len(set(digests.values()))} distinct)")
+    print(f"Duplicates: {len(duplicates)} pairs, {len(reposts)} across different listings")
+    for d in reposts:
+        print(f"  {d['a']}  ~  {d['b']}  (distance {d['distance']})")
+    for path, error in failed:
+        print(f"Error: could not process {path}: {error}", file=sys.stderr)
+    print(f"Manifest written to {os.path.relpath(os.path.join(out_dir, 'manifest.json'), ROOT)}")
+
+    finish('images')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+# Columnar listing store
+#
+# Converts a listings export into a directory of flat binary columns that the
+# offline tools can memory-map, so a job reads only the fields it needs
+# instead of parsing every document:
+#   meta.json             row count, column types, code dictionaries, heap size
+#   <column>.bin          fixed-width NumPy columns, one value per listing
+#                           price/lat/lng f8, createdAt i8 (epoch ms, -1 if unknown),
+#                           views/favorites u4, featured u1
+#                           category/subcategory/condition/province/status u2 codes,
+#                           0 = missing, labels in meta.json; a listing without
+#                           a status field is stored as 'active' (listing_status)
+#   <field>.off/.len      u8 start and u4 byte length of each row's string in heap.bin
+#   heap.bin              UTF-8 strings: id, title, description, first image, city,
+#                         sellerId, and with build --docs the full document as
+#                         canonical JSON (doc, listings_export.canonical_json)
+#
+# build --append adds listings whose id is not in the store yet by appending
+# to every file; nothing already written is rewritten. Edited listings keep
+# their first version until the next full build. meta.json is written last
+# and row counts come from it, so an interrupted append is cut off and redone.
+#
+# listings_export.iter_listings(path, fields) accepts a store directory and
+# rebuilds listings holding only those fields from their columns (FIELDS).
+# Full documents are only there with --docs. ListingStore gives direct access:
+#   store = ListingStore('.build-cache/listings')
+#   prices = store.column('price')              # np.memmap, no parsing
+#   provinces = store.labels('province')[store.column('province')]
+#
+# Usage: python tools/listing_store.py build <export> [--store .build-cache/listings] [--append] [--docs]
+#        python tools/listing_store.py info [--store .build-cache/listings]
+
+import argparse
+import json
+import mmap
+import os
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    sys.exit('NumPy is required: pip install -r tools/requirements.txt')
+
+from buildstats import count, finish, stage, write_text
+from filehash import CACHE_DIR
+from listings_export import canonical_json, iter_documents, listing_status, timestamp_ms
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_STORE = os.path.join(CACHE_DIR, 'listings')
+# 2: a listing without a status field is coded 'active', not missing
+# 3: f8 lat/lng, description and image strings, doc only with --docs
+FORMAT_VERSION = 3
+
+NUMERIC = {
+    'price': 'f8',
+    'lat': 'f8',
+    'lng': 'f8',
+    'createdAt': 'i8',
+    'views': 'u4',
+    'favorites': 'u4',
+    'featured': 'u1',
+}
+CODED = ('category', 'subcategory', 'condition', 'province', 'status')
+CODE_DTYPE = 'u2'
+STRINGS = ('id', 'title', 'description', 'image', 'city', 'sellerId')
+DOC = 'doc'
+
+# Document keys ListingStore.listings() can rebuild from columns. images holds
+# the first image only, userId is userId or seller.id, location has lat, lng,
+# city and province.
+FIELDS = ('id', 'title', 'description', 'images', 'userId', 'price', 'category', 'subcategory',
+          'condition', 'status', 'location', 'createdAt', 'views', 'favorites', 'featured')
+
+MISSING_TIME = -1
+
+# Rows buffered in memory before a flush to disk
+CHUNK_ROWS = 50_000
+
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, 'meta.json'))
+
+
+def _number(value, default):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if np.isfinite(number) else default
+
+
+class ListingStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported store version {self.meta.get('version')}, "
+                             "rebuild it with tools/listing_store.py build")
+        self.rows = self.meta['rows']
+        self._maps = {}
+
+    def _map(self, name, dtype):
+        if name not in self._maps:
+            file = os.path.join(self.path, name)
+            if self.rows == 0 or os.path.getsize(file) == 0:
+                self._maps[name] = np.zeros(0, dtype=dtype)
+            else:
+                # Files may run past meta.json after an interrupted append, ignore the tail
+                self._maps[name] = np.memmap(file, dtype=dtype, mode='r', shape=(self.rows,))
+        return self._maps[name]
+
+    def column(self, name):
+        """Fixed-width column (codes for coded columns) as a read-only memmap."""
+        if name in NUMERIC:
+            return self._map(f'{name}.bin', NUMERIC[name])
+        if name in CODED:
+            return self._map(f'{name}.bin', CODE_DTYPE)
+        raise KeyError(name)
+
+    def labels(self, name):
+        """Code -> label for a coded column, as an array so labels[codes] decodes a whole column."""
+        return np.array(self.meta['codes'][name], dtype=object)
+
+    def has_docs(self):
+        return DOC in self.meta['strings']
+
+    def raw(self, name, rows=None):
+        """A string field as UTF-8 bytes, for every row or only the given rows (indexes or a slice)."""
+        if name not in self.meta['strings']:
+            raise KeyError(name)
+        offsets = np.asarray(self._map(f'{name}.off', 'u8'))
+        lengths = np.asarray(self._map(f'{name}.len', 'u4'))
+        if rows is not None:
+            offsets, lengths = offsets[rows], lengths[rows]
+        heap = self._heap()
+        count('bytes.read', int(lengths.sum(dtype=np.uint64)))
+        return [heap[start:start + length] for start, length in zip(offsets.tolist(), lengths.tolist())]
+
+    def strings(self, name, rows=None):
+        """Decode a string field, for every row or only the given rows (indexes or a slice)."""
+        return [data.decode('utf-8') for data in self.raw(name, rows)]
+
+    def active_rows(self):
+        """Rows whose status is 'active', by listing_status()."""
+        codes = [code for code, label in enumerate(self.labels('status')) if label == 'active']
+        return np.flatnonzero(np.isin(self.column('status'), codes))
+
+    def _heap(self):
+        # A plain mmap slices to bytes far faster than a NumPy memmap per string
+        if 'heap.bin' not in self._maps:
+            if self.meta['heapSize'] == 0:
+                self._maps['heap.bin'] = b''
+            else:
+                with open(os.path.join(self.path, 'heap.bin'), 'rb') as f:
+                    self._maps['heap.bin'] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps['heap.bin']
+
+    def documents(self, rows=None):
+        """Yield listings as the original dicts, which needs a store built with --docs."""
+        if not self.has_docs():
+            raise ValueError(f"{self.path}: built without --docs, full documents are not stored")
+        rows = np.arange(self.rows) if rows is None else rows
+        for start in range(0, len(rows), CHUNK_ROWS):
+            for data in self.raw(DOC, rows[start:start + CHUNK_ROWS]):
+                yield json.loads(data)
+
+    def listings(self, fields, rows=None):
+        """Yield listings holding only the given FIELDS, read from their columns."""
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise KeyError(', '.join(sorted(unknown)))
+        rows = np.arange(self.rows) if rows is None else rows
+        for start in range(0, len(rows), CHUNK_ROWS):
+            chunk = rows[start:start + CHUNK_ROWS]
+            values = {name: self._field(name, chunk) for name in fields}
+            for i in range(len(chunk)):
+                yield {name: column[i] for name, column in values.items()}
+
+    def _field(self, name, rows):
+        """One document key for the given rows, as a list of plain Python values."""
+        if name in ('id', 'title', 'description'):
+            return self.strings(name, rows)
+        if name == 'userId':
+            return self.strings('sellerId', rows)
+        if name == 'images':
+            return [[image] if image else [] for image in self.strings('image', rows)]
+        if name == 'location':
+            lat = np.asarray(self.column('lat'))[rows].tolist()
+            lng = np.asarray(self.column('lng'))[rows].tolist()
+            cities = self.strings('city', rows)
+            provinces = self._field('province', rows)
+            locations = []
+            for i in range(len(rows)):
+                location = {'city': cities[i] or None, 'province': provinces[i]}
+                # NaN is an unknown coordinate, left out like in the export
+                if lat[i] == lat[i] and lng[i] == lng[i]:
+                    location.update(lat=lat[i], lng=lng[i])
+                locations.append(location)
+            return locations
+        if name in CODED:
+            return [label or None for label in self.labels(name)[np.asarray(self.column(name))[rows]].tolist()]
+        values = np.asarray(self.column(name))[rows]
+        if name == 'price':
+            return [None if v != v else int(v) if v.is_integer() else v for v in values.tolist()]
+        if name == 'createdAt':
+            return [None if v == MISSING_TIME else v for v in values.tolist()]
+        if name == 'featured':
+            return values.astype(bool).tolist()
+        return values.tolist()
+
+
+# ---------- Build ----------
+
+class StoreWriter:
+    """Appends rows to a store directory; meta.json is only updated in close()."""
+
+    def __init__(self, path, append, docs=False):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if append and is_store(path):
+            with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+            self.known = set(ListingStore(path).strings('id'))
+        else:
+            self.meta = {
+                'version': FORMAT_VERSION,
+                'rows': 0,
+                'heapSize': 0,
+                'numeric': NUMERIC,
+                'coded': list(CODED),
+                'strings': list(STRINGS) + ([DOC] if docs else []),
+                'codes': {name: [''] for name in CODED},
+            }
+            self.known = set()
+        # An append keeps whatever the store was built with
+        self.strings = self.meta['strings']
+        self.code_index = {name: {label: i for i, label in enumerate(labels)}
+                           for name, labels in self.meta['codes'].items()}
+        self.rows = self.meta['rows']
+        self.heap_size = self.meta['heapSize']
+        if not append and os.path.exists(os.path.join(path, 'meta.json')):
+            # A rebuild that dies halfway must not leave the old meta.json pointing at new files
+            os.remove(os.path.join(path, 'meta.json'))
+        self._truncate(append)
+        self._reset_buffers()
+
+    def _files(self):
+        files = {f'{name}.bin': np.dtype(dtype).itemsize for name, dtype in NUMERIC.items()}
+        files.update({f'{name}.bin': np.dtype(CODE_DTYPE).itemsize for name in CODED})
+        for name in self.strings:
+            files[f'{name}.off'] = 8
+            files[f'{name}.len'] = 4
+        return files
+
+    def _truncate(self, append):
+        # Drop whatever an interrupted run wrote past meta.json (or everything for a rebuild)
+        for name, itemsize in self._files().items():
+            file = os.path.join(self.path, name)
+            with open(file, 'ab'):
+                pass
+            os.truncate(file, self.rows * itemsize if append else 0)
+        heap = os.path.join(self.path, 'heap.bin')
+        with open(heap, 'ab'):
+            pass
+        os.truncate(heap, self.heap_size if append else 0)
+
+    def _reset_buffers(self):
+        self.numeric = {name: [] for name in NUMERIC}
+        self.coded = {name: [] for name in CODED}
+        self.offsets = {name: [] for name in self.strings}
+        self.lengths = {name: [] for name in self.strings}
+        self.heap = bytearray()
+        self.buffered = 0
+
+    def _code(self, name, value):
+        if value is None:
+            label = ''
+        else:
+            # Status is compared exactly, as listing_status() returns it
+            label = str(value) if name == 'status' else str(value).strip()
+        index = self.code_index[name]
+        if label not in index:
+            index[label] = len(self.meta['codes'][name])
+            self.meta['codes'][name].append(label)
+        return index[label]
+
+    def _string(self, name, value):
+        data = (value or '').encode('utf-8')
+        self.offsets[name].append(self.heap_size + len(self.heap))
+        self.lengths[name].append(len(data))
+        self.heap += data
+
+    def add(self, listing):
+        """Buffer one listing; returns False if its id is already stored."""
+        listing_id = listing.get('id')
+        if not listing_id or listing_id in self.known:
+            return False
+        self.known.add(listing_id)
+
+        location = listing.get('location') or {}
+        seller = listing.get('seller') or {}
+        created = timestamp_ms(listing.get('createdAt'))
+        self.numeric['price'].append(_number(listing.get('price'), np.nan))
+        self.numeric['lat'].append(_number(location.get('lat'), np.nan))
+        self.numeric['lng'].append(_number(location.get('lng'), np.nan))
+        self.numeric['createdAt'].append(MISSING_TIME if created is None else created)
+        self.numeric['views'].append(max(0, int(_number(listing.get('views'), 0))))
+        self.numeric['favorites'].append(max(0, int(_number(listing.get('favorites'), 0))))
+        self.numeric['featured'].append(1 if listing.get('featured') else 0)
+
+        for name in CODED:
+            if name == 'status':
+                value = listing_status(listing)
+            else:
+                value = location.get(name) if name == 'province' else listing.get(name)
+            self.coded[name].append(self._code(name, value))
+
+        images = [image for image in (listing.get('images') or []) if isinstance(image, str)]
+        self._string('id', listing_id)
+        self._string('title', listing.get('title'))
+        self._string('description', listing.get('description'))
+        self._string('image', images[0] if images else None)
+        self._string('city', location.get('city'))
+        self._string('sellerId', listing.get('userId') or seller.get('id'))
+        if DOC in self.offsets:
+            self._string(DOC, canonical_json(listing))
+
+        self.buffered += 1
+        if self.buffered >= CHUNK_ROWS:
+            self.flush()
+        return True
+
+    def _append(self, name, array):
+        with open(os.path.join(self.path, name), 'ab') as f:
+            array.tofile(f)
+        count('bytes.written', array.nbytes)
+
+    def flush(self):
+        if not self.buffered:
+            return
+        for name, dtype in NUMERIC.items():
+            self._append(f'{name}.bin', np.array(self.numeric[name], dtype=dtype))
+        for name in CODED:
+            self._append(f'{name}.bin', np.array(self.coded[name], dtype=CODE_DTYPE))
+        for name in self.strings:
+            self._append(f'{name}.off', np.array(self.offsets[name], dtype='u8'))
+            self._append(f'{name}.len', np.array(self.lengths[name], dtype='u4'))
+        with open(os.path.join(self.path, 'heap.bin'), 'ab') as f:
+            f.write(self.heap)
+        count('bytes.written', len(self.heap))
+        self.rows += self.buffered
+        self.heap_size += len(self.heap)
+        self._reset_buffers()
+
+    def close(self):
+        self.flush()
+        if any(len(labels) > np.iinfo(CODE_DTYPE).max for labels in self.meta['codes'].values()):
+            raise ValueError('too many distinct values for a coded column')
+        self.meta['rows'] = self.rows
+        self.meta['heapSize'] = self.heap_size
+        # Last, so the new rows only become visible once every column has them
+        write_text(os.path.join(self.path, 'meta.json'), json.dumps(self.meta, ensure_ascii=False, indent=1) + '\n')
+
+
+def store_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def cmd_build(args):
+    export = os.path.abspath(args.export)
+    store = os.path.abspath(args.store) if args.store else os.path.join(ROOT, DEFAULT_STORE)
+    os.chdir(ROOT)
+
+    with stage('store.build'):
+        writer = StoreWriter(store, args.append, args.docs)
+        start = writer.rows
+        added = skipped = 0
+        for listing in iter_documents(export, 'listings'):
+            if writer.add(listing):
+                added += 1
+            else:
+                skipped += 1
+        writer.close()
+
+    size = store_size(store)
+    source = os.path.getsize(export)
+    print(f"{'Appended' if args.append else 'Stored'} {added:,} listings "
+          f"({start:,} already in the store, {skipped:,} skipped as duplicate or without id)")
+    print(f"Store: {writer.rows:,} rows, {size / 1e6:.1f} MB on disk "
+          f"(export {source / 1e6:.1f} MB) in {os.path.relpath(store, ROOT)}")
+    finish('store')
+
+
+def cmd_info(args):
+    store_path = os.path.abspath(args.store) if args.store else os.path.join(ROOT, DEFAULT_STORE)
+    os.chdir(ROOT)
+    if not is_store(store_path):
+        sys.exit(f'No listing store at {os.path.relpath(store_path, ROOT)}')
+    store = ListingStore(store_path)
+
+    print(f"{os.path.relpath(store_path, ROOT)}: {store.rows:,} listings, "
+          f"{store_size(store_path) / 1e6:.1f} MB")
+    for name in NUMERIC:
+        size = os.path.getsize(os.path.join(store_path, f'{name}.bin'))
+        print(f"  {name:<12} {NUMERIC[name]:<4} {size / 1e6:>8.2f} MB")
+    for name in CODED:
+        size = os.path.getsize(os.path.join(store_path, f'{name}.bin'))
+        print(f"  {name:<12} {CODE_DTYPE:<4} {size / 1e6:>8.2f} MB  {len(store.labels(name)) - 1} values")
+    heap = os.path.getsize(os.path.join(store_path, 'heap.bin'))
+    print(f"  {'strings':<12} {'heap':<4} {heap / 1e6:>8.2f} MB  {', '.join(store.meta['strings'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar, memory-mappable store for listing exports.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='convert an export into a store')
+    build.add_argument('export', help='listings export (.ndjson/.jsonl or .json)')
+    build.add_argument('--store', help=f'store directory (default {DEFAULT_STORE})')
+    build.add_argument('--append', action='store_true', help='only append listings not in the store yet')
+    build.add_argument('--docs', action='store_true',
+                       help='also store every document as JSON (tools/prerender.py needs them)')
+
+    info = sub.add_parser('info', help='show rows and column sizes')
+    info.add_argument('--store', help=f'store directory (default {DEFAULT_STORE})')
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        cmd_build(args)
+    else:
+        cmd_info(args)
+
+
+if __name__ == '__main__':
+    main()
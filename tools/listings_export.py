@@ -0,0 +1,100 @@
+# Listings export reader
+# Shared by the offline tools that work on a dump of the listings collection
+# (or another collection, see iter_documents).
+#
+# An export is either:
+#   - NDJSON (.ndjson / .jsonl), one document per line, streamed
+#   - a JSON array (.json) of documents
+#   - for listings, a columnar store directory built by tools/listing_store.py
+# Each listing is shaped like the documents in js/sample-data.js / post-ad.js.
+# Firestore timestamps may be ISO strings, epoch milliseconds or
+# {"_seconds": ..., "_nanoseconds": ...} objects as written by the Admin SDK.
+
+import json
+import os
+from datetime import datetime, timezone
+
+from buildstats import count
+
+
+def iter_listings(path, fields=None, active=False):
+    """Yield listing dicts from an export, one at a time for NDJSON.
+
+    From a listing store, fields (listing_store.FIELDS) are read from their
+    columns and nothing else is; without fields the stored documents are parsed,
+    which needs a store built with --docs. Export documents always come whole.
+    active=True skips listings whose listing_status() is not 'active'.
+    """
+    if os.path.isdir(path):
+        # Imported here so plain exports never need NumPy
+        from listing_store import ListingStore
+        store = ListingStore(path)
+        rows = store.active_rows() if active else None
+        return store.listings(fields, rows) if fields else store.documents(rows)
+    listings = iter_documents(path, 'listings')
+    if active:
+        return (listing for listing in listings if listing_status(listing) == 'active')
+    return listings
+
+
+def listing_status(listing):
+    """The listing's status, 'active' when the field is absent (older documents).
+    A null or empty status is kept as is and is not active."""
+    return listing.get('status', 'active')
+
+
+def canonical_json(doc):
+    """Sorted, compact JSON of a document: equal documents give equal bytes."""
+    return json.dumps(doc, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def iter_documents(path, collection):
+    """Yield documents from an export of any collection, one at a time for NDJSON."""
+    if path.endswith(('.ndjson', '.jsonl')):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                count('bytes.read', len(line))
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    count('bytes.read', len(text))
+    data = json.loads(text)
+    # Accept {"<collection>": [...]} as well as a bare array
+    if isinstance(data, dict):
+        data = data.get(collection, [])
+    yield from data
+
+
+def timestamp_ms(value):
+    """Convert any exported timestamp representation to epoch milliseconds."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        # Seconds and milliseconds both show up in exports
+        return int(value * 1000) if value < 1e11 else int(value)
+    if isinstance(value, dict):
+        seconds = value.get('_seconds', value.get('seconds'))
+        if seconds is None:
+            return None
+        nanos = value.get('_nanoseconds', value.get('nanoseconds', 0))
+        return int(seconds * 1000 + nanos // 1_000_000)
+    if isinstance(value, str):
+        try:
+            dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp() * 1000)
+    return None
+
+
+def iso_timestamp(value):
+    ms = timestamp_ms(value)
+    if ms is None:
+        return None
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
@@ -0,0 +1,169 @@
+# Blur-up placeholders and dominant colours
+#
+# For an image this computes:
+#   - a tiny blurred WebP (longest edge PLACEHOLDER_EDGE px) as a data URI, which
+#     the browser stretches over the full box while the real image loads
+#   - the dominant colour, painted before even the placeholder has decoded
+#
+# Results are cached by content hash in .build-cache/placeholders.json, so an
+# image is only decoded again when its bytes change.
+#
+# tools/images.py stores both in the listing photo manifest. Run on its own, this
+# tool inlines them for the hero slides into css/hero-slider.css: every
+# .slider-image in index.html carries its photo in data-src, and
+# js/hero-slider.js swaps the full image in once it has loaded.
+#
+# Usage: python tools/placeholders.py [--check]
+
+import argparse
+import base64
+import io
+import json
+import os
+import re
+import sys
+
+try:
+    from PIL import Image, ImageFilter, ImageOps
+except ImportError:
+    sys.exit('Pillow is required: pip install -r tools/requirements.txt')
+
+from buildstats import count, finish, read_text, stage, write_text
+from filehash import CACHE_DIR, HashCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLACEHOLDER_EDGE = 16
+PLACEHOLDER_QUALITY = 40
+PALETTE_SIZE = 5
+
+CACHE_PATH = os.path.join(CACHE_DIR, 'placeholders.json')
+
+HERO_PAGE = 'index.html'
+HERO_CSS = 'css/hero-slider.css'
+SLIDE_RE = re.compile(r'<div class="slider-image[^"]*"[^>]*\bdata-src="([^"]+)"')
+
+BLOCK_START = '/* ===== Hero Placeholders (generated by tools/placeholders.py, do not edit) ===== */'
+BLOCK_END = '/* ===== End Hero Placeholders ===== */'
+BLOCK_RE = re.compile(re.escape(BLOCK_START) + r'.*?' + re.escape(BLOCK_END) + r'\n?', re.S)
+
+
+def placeholder(img):
+    """Data URI of a tiny, slightly blurred copy of img."""
+    small = img.convert('RGB')
+    small.thumbnail((PLACEHOLDER_EDGE, PLACEHOLDER_EDGE), Image.LANCZOS)
+    small = small.filter(ImageFilter.GaussianBlur(0.6))
+    buffer = io.BytesIO()
+    small.save(buffer, 'WEBP', quality=PLACEHOLDER_QUALITY)
+    return 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def dominant_color(img):
+    """Most common colour after reducing img to a small palette, as #rrggbb."""
+    small = img.convert('RGB').resize((64, 64), Image.BILINEAR)
+    quantized = small.quantize(colors=PALETTE_SIZE, method=Image.Quantize.MEDIANCUT)
+    palette = quantized.getpalette()
+    _, index = max(quantized.getcolors())
+    r, g, b = palette[index * 3:index * 3 + 3]
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def describe(path):
+    """Placeholder, colour and size of the image at path."""
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        width, height = img.size
+        return {'placeholder': placeholder(img), 'color': dominant_color(img), 'width': width, 'height': height}
+
+
+class PlaceholderCache:
+    """Placeholders by content hash, on top of the file stat cache."""
+
+    def __init__(self):
+        self.hashes = HashCache('placeholders-files')
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(CACHE_PATH):
+            with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def get(self, path):
+        digest = self.hashes.digest(path)
+        entry = self.entries.get(digest)
+        if entry is None:
+            count('cache.miss')
+            entry = self.entries[digest] = describe(path)
+            self.dirty = True
+        else:
+            count('cache.hit')
+        return entry
+
+    def save(self):
+        self.hashes.save()
+        if self.dirty:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            write_text(CACHE_PATH, json.dumps(self.entries, separators=(',', ':'), sort_keys=True))
+            self.dirty = False
+
+
+def hero_block(slides):
+    lines = [BLOCK_START]
+    for n, (src, entry) in enumerate(slides, 1):
+        lines += [
+            f'/* {src} ({entry["width"]}x{entry["height"]}) */',
+            f'.slider-image:nth-child({n}) {{',
+            f'    background-color: {entry["color"]};',
+            f'    background-image: url(\'{entry["placeholder"]}\');',
+            '}',
+            '',
+        ]
+    lines[-1] = BLOCK_END
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inline blur-up placeholders for the hero slides.')
+    parser.add_argument('--check', action='store_true',
+                        help='exit non-zero if css/hero-slider.css is out of date instead of writing it')
+    args = parser.parse_args()
+    os.chdir(ROOT)
+
+    cache = PlaceholderCache()
+    with stage('placeholders.hero'):
+        sources = SLIDE_RE.findall(read_text(HERO_PAGE))
+        slides = []
+        for src in sources:
+            path = os.path.normpath(src)
+            if not os.path.exists(path):
+                print(f"Warning: {src} referenced by {HERO_PAGE} does not exist", file=sys.stderr)
+                continue
+            slides.append((src, cache.get(path)))
+        cache.save()
+
+    with stage('placeholders.css'):
+        css = read_text(HERO_CSS)
+        block = hero_block(slides) if slides else ''
+        if BLOCK_RE.search(css):
+            updated = BLOCK_RE.sub(lambda _: block, css)
+        else:
+            updated = css.rstrip('\n') + '\n\n' + block
+        changed = updated != css
+        if changed and not args.check:
+            write_text(HERO_CSS, updated)
+
+    size = sum(len(entry['placeholder']) for _, entry in slides)
+    print(f"Hero slides: {len(slides)} of {len(sources)} ({size} bytes of inline placeholders)")
+    for src, entry in slides:
+        print(f"  {entry['color']}  {src}")
+    if args.check:
+        print(f"{HERO_CSS} is {'out of date' if changed else 'up to date'}")
+    elif changed:
+        print(f"Updated {HERO_CSS}")
+
+    finish('placeholders')
+    if args.check and changed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# Precache manifest + service worker generator
+#
+# Scans the public pages for the local CSS/JS they load, hashes every
+# app-shell asset and writes:
+#   precache-manifest.json  - per-page asset lists plus hash/size per asset
+#   sw.js                   - service worker with the manifest inlined
+#
+# Hashes come from tools/filehash.py, so a re-run only re-reads files whose
+# size or mtime changed, and nothing is rewritten when the manifest is the same.
+#
+# Usage: python tools/precache.py
+
+import glob
+import json
+import os
+import re
+import sys
+from urllib.parse import urlsplit
+
+from buildstats import finish, read_text, stage, write_text
+from filehash import HashCache, hash_bytes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pages that make up the app shell (admin pages are left out on purpose)
+SHELL_PAGES = [
+    'index.html',
+    'pages/*.html',
+    'pages/auth/*.html',
+    'pages/messages/*.html',
+]
+
+SHELL_EXTENSIONS = ('.html', '.css', '.js')
+
+# Served stale-while-revalidate from the runtime cache
+RUNTIME_HOSTS = ['images.unsplash.com', 'firebasestorage.googleapis.com', 'i.pravatar.cc']
+RUNTIME_PATH_PREFIXES = ['images/', 'data/', 'listings/']
+RUNTIME_MAX_ENTRIES = 200
+
+MANIFEST_PATH = 'precache-manifest.json'
+SW_PATH = 'sw.js'
+SW_TEMPLATE = 'tools/sw-template.js'
+
+ASSET_RE = re.compile(r'<(?:script|link)\b[^>]*?\b(?:src|href)\s*=\s*["\']([^"\']+)["\']', re.I)
+
+
+def page_assets(page):
+    """Return the local shell assets referenced by page, as site-root paths."""
+    html = read_text(page)
+
+    base = os.path.dirname(page)
+    assets = []
+    for ref in ASSET_RE.findall(html):
+        parts = urlsplit(ref)
+        if parts.scheme or parts.netloc or not parts.path.endswith(SHELL_EXTENSIONS):
+            continue
+        path = os.path.normpath(os.path.join(base, parts.path)).replace(os.sep, '/')
+        if path not in assets:
+            assets.append(path)
+    return assets
+
+
+def build_manifest(hashes):
+    pages = {}
+    assets = {}
+    missing = set()
+
+    shell_pages = sorted({p.replace(os.sep, '/') for pattern in SHELL_PAGES for p in glob.glob(pattern)})
+    for page in shell_pages:
+        present = []
+        for path in [page] + page_assets(page):
+            if not os.path.isfile(path):
+                # e.g. js/firebase-config.js before it has been created
+                missing.add(path)
+                continue
+            if path not in assets:
+                assets[path] = {'hash': hashes.digest(path), 'size': os.path.getsize(path)}
+            present.append(path)
+        pages[page] = present
+
+    assets = dict(sorted(assets.items()))
+    version = hash_bytes(json.dumps(assets, sort_keys=True).encode('utf-8'))
+    return {'version': version, 'pages': pages, 'assets': assets}, sorted(missing)
+
+
+def render_sw(manifest):
+    template = read_text(SW_TEMPLATE)
+
+    # The worker only needs the asset table, the page lists are for tooling
+    inline = {'version': manifest['version'], 'assets': manifest['assets']}
+    return (template
+            .replace('__PRECACHE_MANIFEST__', json.dumps(inline, indent=4))
+            .replace('__RUNTIME_MAX_ENTRIES__', str(RUNTIME_MAX_ENTRIES))
+            .replace('__RUNTIME_HOSTS__', json.dumps(RUNTIME_HOSTS))
+            .replace('__RUNTIME_PATH_PREFIXES__', json.dumps(RUNTIME_PATH_PREFIXES)))
+
+
+def write_if_changed(path, content):
+    if os.path.exists(path) and read_text(path) == content:
+        return False
+    write_text(path, content)
+    return True
+
+
+def main():
+    os.chdir(ROOT)
+
+    hashes = HashCache('precache')
+    with stage('precache.manifest'):
+        manifest, missing = build_manifest(hashes)
+        hashes.save()
+
+    with stage('precache.write'):
+        manifest_changed = write_if_changed(MANIFEST_PATH, json.dumps(manifest, indent=2) + '\n')
+        sw_changed = write_if_changed(SW_PATH, render_sw(manifest))
+
+    total = sum(a['size'] for a in manifest['assets'].values())
+    print(f"Precache manifest {manifest['version']}: "
+          f"{len(manifest['assets'])} assets across {len(manifest['pages'])} pages ({total / 1024:.1f} KB)")
+    for path in missing:
+        print(f"Warning: {path} is referenced but missing, skipped", file=sys.stderr)
+    if manifest_changed or sw_changed:
+        print(f"Wrote {MANIFEST_PATH} and {SW_PATH}")
+    else:
+        print("Manifest unchanged, nothing written")
+
+    finish('precache')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,434 @@
+# Static listing-detail prerenderer
+#
+# Writes listings/<id>.html for every active listing in an export, using
+# pages/listing-detail.html as the template with the title, price, images,
+# location and seller already filled in, plus sitemap.xml for search engines.
+# listing-detail.js picks the embedded listing up (window.PRERENDERED_LISTING)
+# instead of fetching it from Firestore.
+#
+# Rendering runs across a process pool. Each listing's content hash is kept
+# in .build-cache/prerender.json, so --incremental only re-renders listings
+# that changed and removes pages for listings that are gone or no longer active.
+#
+# A listing store built with --docs can stand in for the export. Its documents
+# are canonical JSON, so they are hashed as stored and only the ones that get
+# re-rendered are parsed.
+#
+# Usage: python tools/prerender.py <export.ndjson|export.json|store> [--incremental]
+#            [--base-url https://canadian-ai-classifieds.web.app] [--workers N]
+
+import argparse
+import html
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from buildstats import count, finish, read_text, stage, write_text
+from filehash import CACHE_DIR, hash_bytes
+from listings_export import canonical_json, iso_timestamp, iter_listings, timestamp_ms
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TEMPLATE_PATH = 'pages/listing-detail.html'
+CATEGORIES_PATH = 'js/sample-data.js'
+OUTPUT_DIR = 'listings'
+SITEMAP_DIR = 'sitemaps'
+STATE_PATH = os.path.join(CACHE_DIR, 'prerender.json')
+
+DEFAULT_BASE_URL = 'https://canadian-ai-classifieds.web.app'
+
+# Bump when the rendered output changes without the template changing
+RENDER_VERSION = '2'
+
+# Listings handed to a worker at a time
+BATCH_SIZE = 2000
+
+# Search engines accept at most 50,000 URLs per sitemap file
+SITEMAP_LIMIT = 50000
+
+SLOT_RE = re.compile(r'@@(\w+)@@')
+CATEGORY_RE = re.compile(r"'([\w-]+)':\s*{\s*name:\s*'([^']+)',\s*icon:\s*'([^']+)'")
+
+
+# ---------- Template ----------
+
+def slot_text(template, element_id, slot):
+    """Replace the contents of the element with element_id by a slot."""
+    pattern = re.compile(r'(<(\w+)\b[^>]*\bid="' + element_id + r'"[^>]*>)(.*?)(</\2>)', re.S)
+    return pattern.sub(lambda m: m.group(1) + f'@@{slot}@@' + m.group(4), template, count=1)
+
+
+def slot_attr(template, element_id, attr, slot):
+    pattern = re.compile(r'(<\w+\b[^>]*\bid="' + element_id + r'"[^>]*?\b' + attr + r'=")[^"]*(")', re.S)
+    return pattern.sub(lambda m: m.group(1) + f'@@{slot}@@' + m.group(2), template, count=1)
+
+
+def slot_style(template, element_id, slot):
+    pattern = re.compile(r'(<\w+\b[^>]*\bid="' + element_id + r'"[^>]*?)\s*style="display:none;"', re.S)
+    return pattern.sub(lambda m: m.group(1) + f'@@{slot}@@', template, count=1)
+
+
+def slot_class_text(template, class_name, slot):
+    pattern = re.compile(r'(<(\w+)\b[^>]*\bclass="' + class_name + r'"[^>]*>)(.*?)(</\2>)', re.S)
+    return pattern.sub(lambda m: m.group(1) + f'@@{slot}@@' + m.group(4), template, count=1)
+
+
+def compile_template(template):
+    """Turn listing-detail.html into [static, slot, static, slot, ...] once."""
+    for element_id in ('listingCategory', 'listingTitle', 'listingPrice', 'viewCount', 'postedTime',
+                       'listingDescription', 'detailCondition', 'detailCategory', 'detailLocation',
+                       'detailPosted', 'sellerName', 'thumbnailGrid', 'imageCounter',
+                       'breadcrumbCategory', 'breadcrumbTitle'):
+        template = slot_text(template, element_id, element_id)
+
+    template = slot_attr(template, 'mainImage', 'src', 'mainImageSrc')
+    template = slot_attr(template, 'mainImage', 'alt', 'mainImageAlt')
+    template = slot_attr(template, 'sellerAvatar', 'src', 'sellerAvatarSrc')
+    template = slot_attr(template, 'sellerAvatar', 'alt', 'sellerAvatarAlt')
+    template = slot_style(template, 'featuredBadge', 'featuredStyle')
+    template = slot_style(template, 'verifiedBadge', 'verifiedStyle')
+    template = slot_class_text(template, 'rating-stars', 'ratingStars')
+    template = slot_class_text(template, 'rating-text', 'ratingText')
+
+    template = re.sub(r'<title>.*?</title>', '<title>@@pageTitle@@</title>', template, count=1)
+    template = re.sub(r'(<meta name="description" content=")[^"]*(")', r'\1@@metaDescription@@\2', template, count=1)
+    template = template.replace('</head>', '@@headExtra@@</head>', 1)
+
+    # Pages live in listings/, resolve the template's relative URLs as if in pages/.
+    # <base> must come before the stylesheets for them to pick it up.
+    template = template.replace('<head>', '<head>\n    <base href="../pages/">', 1)
+
+    # Placeholder links would resolve against <base> and leave the page
+    template = template.replace('href="#', 'href="@@selfUrl@@#')
+
+    template = re.sub(r'(\s*<script src="[^"]*listing-detail\.js[^"]*"></script>)',
+                      r'@@listingData@@\1', template, count=1)
+    return SLOT_RE.split(template)
+
+
+def load_categories():
+    return {key: (name, icon) for key, name, icon in CATEGORY_RE.findall(read_text(CATEGORIES_PATH))}
+
+
+# ---------- Rendering ----------
+
+def esc(value):
+    return html.escape(str(value if value is not None else ''), quote=True)
+
+
+def format_price(price):
+    try:
+        return f'${float(price):,.0f}'
+    except (TypeError, ValueError):
+        return '$0'
+
+
+def format_date(ms):
+    if not ms:
+        return '-'
+    dt = datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+    return f'{dt:%B} {dt.day}, {dt.year}'
+
+
+def listing_url(base_url, listing_id):
+    return f'{base_url}/{OUTPUT_DIR}/{listing_id}.html'
+
+
+def page_values(listing, categories, base_url):
+    location = listing.get('location') or {}
+    seller = listing.get('seller') or {}
+    images = [img for img in (listing.get('images') or []) if isinstance(img, str)] or ['../images/placeholder.jpg']
+    category_name, category_icon = categories.get(listing.get('category'), categories.get('other', ('Other', '📦')))
+    title = listing.get('title') or 'Listing'
+    description = listing.get('description') or ''
+    price = format_price(listing.get('price'))
+    place = ', '.join(p for p in (location.get('city'), location.get('province')) if p)
+    created_iso = iso_timestamp(listing.get('createdAt'))
+    created_ms = timestamp_ms(listing.get('createdAt'))
+    posted = format_date(created_ms)
+    rating = float(seller.get('rating') or 5.0)
+    reviews = int(seller.get('reviewCount') or 0)
+    url = listing_url(base_url, listing['id'])
+
+    # Embedded copy for listing-detail.js, timestamps normalised to ISO strings
+    data = dict(listing, images=images, createdAt=created_iso)
+    if 'updatedAt' in listing:
+        data['updatedAt'] = iso_timestamp(listing['updatedAt'])
+    # Sorted so an export and a listing store render the same bytes
+    data_json = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+
+    product = {
+        '@context': 'https://schema.org',
+        '@type': 'Product',
+        'name': title,
+        'description': description[:500],
+        'image': images,
+        'url': url,
+        'offers': {
+            '@type': 'Offer',
+            'price': listing.get('price'),
+            'priceCurrency': 'CAD',
+            'availability': 'https://schema.org/InStock',
+            'areaServed': place,
+        },
+    }
+    product_json = json.dumps(product, ensure_ascii=False).replace('</', '<\\/')
+
+    head_extra = (
+        f'    <link rel="canonical" href="{esc(url)}">\n'
+        f'    <meta property="og:type" content="product">\n'
+        f'    <meta property="og:title" content="{esc(title)}">\n'
+        f'    <meta property="og:description" content="{esc(description[:200])}">\n'
+        f'    <meta property="og:image" content="{esc(images[0])}">\n'
+        f'    <meta property="og:url" content="{esc(url)}">\n'
+        f'    <script type="application/ld+json">{product_json}</script>\n'
+    )
+
+    thumbnails = ''.join(
+        f'\n                            <img src="{esc(img)}" alt="Listing image {i + 1}" '
+        f'class="thumbnail{" active" if i == 0 else ""}" data-index="{i}">'
+        for i, img in enumerate(images)
+    ) + '\n                        '
+
+    return {
+        'pageTitle': esc(f'{title} - {price} | Canadian AI Classifieds'),
+        'metaDescription': esc(f'{price} - {description[:150]}'),
+        'headExtra': head_extra,
+        'selfUrl': f'../{OUTPUT_DIR}/{esc(listing["id"])}.html',
+        'listingData': f'\n    <script>window.PRERENDERED_LISTING = {data_json};</script>',
+        'listingCategory': esc(f'{category_icon} {category_name}'),
+        'listingTitle': esc(title),
+        'listingPrice': price,
+        'viewCount': f'{int(listing.get("views") or 0)} views',
+        'postedTime': esc(posted),
+        'listingDescription': esc(description),
+        'detailCondition': esc(listing.get('condition') or '-'),
+        'detailCategory': esc(category_name),
+        'detailLocation': esc(place or '-'),
+        'detailPosted': esc(posted),
+        'sellerName': esc(seller.get('name') or 'Anonymous'),
+        'sellerAvatarSrc': esc(seller.get('avatar') or ''),
+        'sellerAvatarAlt': esc(seller.get('name') or 'Seller'),
+        'verifiedStyle': '' if seller.get('verified') else ' style="display:none;"',
+        'featuredStyle': '' if listing.get('featured') else ' style="display:none;"',
+        'ratingStars': '★' * int(rating) + '☆' * (5 - int(rating)),
+        'ratingText': f'{rating:.1f} ({reviews} review{"" if reviews == 1 else "s"})',
+        'mainImageSrc': esc(images[0]),
+        'mainImageAlt': esc(title),
+        'thumbnailGrid': thumbnails,
+        'imageCounter': f'1 / {len(images)}',
+        'breadcrumbCategory': esc(category_name),
+        'breadcrumbTitle': esc(title if len(title) <= 40 else title[:40] + '...'),
+    }
+
+
+def render(parts, values):
+    out = list(parts)
+    out[1::2] = [values[name] for name in parts[1::2]]
+    return ''.join(out)
+
+
+_worker = {}
+
+
+def init_worker(parts, categories, base_url):
+    _worker.update(parts=parts, categories=categories, base_url=base_url)
+
+
+def render_batch(listings):
+    """Render and write a batch of listings, returns bytes written."""
+    written = 0
+    for listing in listings:
+        page = render(_worker['parts'], page_values(listing, _worker['categories'], _worker['base_url']))
+        data = page.encode('utf-8')
+        with open(os.path.join(OUTPUT_DIR, f'{listing["id"]}.html'), 'wb') as f:
+            f.write(data)
+        written += len(data)
+    return written
+
+
+# ---------- Incremental state ----------
+
+def content_hash(listing):
+    return hash_bytes(canonical_json(listing).encode('utf-8'))
+
+
+def export_entries(export):
+    """(id, content hash, loader) for every active listing in an export."""
+    for listing in iter_listings(export, active=True):
+        if safe_id(listing.get('id')):
+            yield listing['id'], content_hash(listing), lambda listing=listing: listing
+
+
+def store_entries(path):
+    """(id, content hash, loader) for every active listing in a listing store."""
+    # Imported here so plain exports never need NumPy
+    from listing_store import CHUNK_ROWS, DOC, ListingStore
+    store = ListingStore(path)
+    if not store.has_docs():
+        sys.exit(f'{path} has no documents to render, build it with tools/listing_store.py build --docs')
+    rows = store.active_rows()
+    for start in range(0, len(rows), CHUNK_ROWS):
+        chunk = rows[start:start + CHUNK_ROWS]
+        for listing_id, data in zip(store.strings('id', chunk), store.raw(DOC, chunk)):
+            if safe_id(listing_id):
+                # Stored as canonical_json(), so this equals content_hash() of the parsed document
+                yield listing_id, hash_bytes(data), lambda data=data: json.loads(data)
+
+
+def lastmod(listing):
+    ms = timestamp_ms(listing.get('updatedAt')) or timestamp_ms(listing.get('createdAt'))
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime('%Y-%m-%d') if ms else None
+
+
+def load_state():
+    if os.path.exists(STATE_PATH):
+        return json.loads(read_text(STATE_PATH))
+    return {'template': None, 'listings': {}}
+
+
+def save_state(state):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    write_text(STATE_PATH, json.dumps(state, separators=(',', ':')))
+
+
+def safe_id(listing_id):
+    return isinstance(listing_id, str) and re.fullmatch(r'[\w-]+', listing_id) is not None
+
+
+# ---------- Sitemap ----------
+
+def write_sitemaps(entries, base_url):
+    """Write sitemaps/listings-N.xml shards and a sitemap.xml index."""
+    os.makedirs(SITEMAP_DIR, exist_ok=True)
+    ids = sorted(entries)
+    shards = [ids[i:i + SITEMAP_LIMIT] for i in range(0, len(ids), SITEMAP_LIMIT)] or [[]]
+
+    for n, shard in enumerate(shards, 1):
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for listing_id in shard:
+            modified = entries[listing_id][1]
+            lines.append(f'  <url><loc>{esc(listing_url(base_url, listing_id))}</loc>'
+                         + (f'<lastmod>{modified}</lastmod>' if modified else '') + '</url>')
+        lines.append('</urlset>')
+        write_text(os.path.join(SITEMAP_DIR, f'listings-{n}.xml'), '\n'.join(lines) + '\n')
+
+    # Drop shards left over from a larger catalog
+    n = len(shards) + 1
+    while os.path.exists(os.path.join(SITEMAP_DIR, f'listings-{n}.xml')):
+        os.remove(os.path.join(SITEMAP_DIR, f'listings-{n}.xml'))
+        n += 1
+
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for n in range(1, len(shards) + 1):
+        lines.append(f'  <sitemap><loc>{base_url}/{SITEMAP_DIR}/listings-{n}.xml</loc></sitemap>')
+    lines.append('</sitemapindex>')
+    write_text('sitemap.xml', '\n'.join(lines) + '\n')
+    return len(shards)
+
+
+# ---------- Main ----------
+
+def main():
+    parser = argparse.ArgumentParser(description='Prerender listing-detail pages from a listings export.')
+    parser.add_argument('export', help='listings export (.ndjson/.jsonl or .json) or listing store built with --docs')
+    parser.add_argument('--incremental', action='store_true', help='only re-render listings whose content changed')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help='site URL used in canonical links and the sitemap')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='render processes (1 renders inline)')
+    args = parser.parse_args()
+
+    export = os.path.abspath(args.export)
+    base_url = args.base_url.rstrip('/')
+    os.chdir(ROOT)
+
+    with stage('prerender.template'):
+        template = read_text(TEMPLATE_PATH)
+        categories = load_categories()
+        parts = compile_template(template)
+        template_hash = hash_bytes((template + RENDER_VERSION + base_url + json.dumps(categories)).encode('utf-8'))
+
+    with stage('prerender.state'):
+        state = load_state()
+    previous = state['listings'] if args.incremental and state['template'] == template_hash else {}
+    current = {}
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    rendered = 0
+    skipped = 0
+    with stage('prerender.render'):
+        pool = None
+        if args.workers > 1:
+            pool = ProcessPoolExecutor(args.workers, initializer=init_worker,
+                                       initargs=(parts, categories, base_url))
+        else:
+            init_worker(parts, categories, base_url)
+
+        pending = []
+        batch = []
+
+        def flush():
+            nonlocal batch
+            if not batch:
+                return
+            if pool:
+                pending.append(pool.submit(render_batch, batch))
+                # Keep a bounded number of batches in flight
+                while len(pending) > args.workers * 2:
+                    count('bytes.written', pending.pop(0).result())
+            else:
+                count('bytes.written', render_batch(batch))
+            batch = []
+
+        entries = store_entries(export) if os.path.isdir(export) else export_entries(export)
+        for listing_id, digest, load in entries:
+            old = previous.get(listing_id)
+            if old and old[0] == digest:
+                # Same content, same lastmod
+                current[listing_id] = old
+                count('cache.hit')
+                skipped += 1
+                continue
+            count('cache.miss')
+            listing = load()
+            current[listing_id] = [digest, lastmod(listing)]
+            batch.append(listing)
+            rendered += 1
+            if len(batch) >= BATCH_SIZE:
+                flush()
+        flush()
+
+        for future in pending:
+            count('bytes.written', future.result())
+        if pool:
+            pool.shutdown()
+
+    with stage('prerender.cleanup'):
+        # Pages for listings that were removed, sold or made private
+        if args.incremental:
+            stale = [i for i in state['listings'] if i not in current]
+        else:
+            stale = [name[:-5] for name in os.listdir(OUTPUT_DIR)
+                     if name.endswith('.html') and name[:-5] not in current]
+        for listing_id in stale:
+            path = os.path.join(OUTPUT_DIR, f'{listing_id}.html')
+            if os.path.exists(path):
+                os.remove(path)
+
+    with stage('prerender.sitemap'):
+        shards = write_sitemaps(current, base_url)
+        save_state({'template': template_hash, 'listings': current})
+
+    print(f"Prerendered {rendered} listing pages into {OUTPUT_DIR}/ "
+          f"({skipped} unchanged, {len(stale)} removed)")
+    print(f"Sitemap: {len(current)} URLs in {shards} file(s), index at sitemap.xml")
+
+    finish('prerender')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+# Coalesced price-drop alert planner
+#
+# onListingPriceChanged (functions/index.js) fans out once per price update:
+# one favorites query for the listing, then one users/{uid} read per favorite,
+# then one email per user. A seller cutting 50 prices runs 50 fan-outs, and a
+# user who saved several of those listings gets several emails.
+#
+# This plans the same alerts as a batch over local exports:
+#   1. price-change events are grouped into tumbling windows (--window minutes)
+#   2. within a window, repeated changes to one listing collapse to the net
+#      change (first old price -> last new price), then the function's rule is
+#      applied: a drop of at least 10% or $50
+#   3. favorites are looked up for all dropped listings at once ('in' queries
+#      of up to IN_QUERY_LIMIT listing IDs)
+#   4. each affected user is read once per window (getAll in batches of
+#      GET_ALL_BATCH), and users with priceDrops turned off are skipped
+#   5. every user gets one email listing all of their saved items that dropped
+#
+# Emails go to a fake mail sink (an NDJSON outbox), nothing is sent. The report
+# compares Firestore reads, round trips and emails with per-event processing.
+#
+# Inputs are exports as read by tools/listings_export.py:
+#   events      {"listingId", "oldPrice", "newPrice", "at"}  one per listing update
+#   favorites   {"userId", "listingId"}                    users/{uid}/favorites docs
+#   users       {"id", "email", "displayName", "emailNotifications"}
+#   listings    the listings export or store, for titles and first images
+#
+# Usage: python tools/price_alerts.py <events> --favorites <export> --users <export>
+#            [--listings <export>] [--window 60] [--outbox price-alerts-outbox.ndjson]
+
+import argparse
+import json
+import math
+import os
+
+from buildstats import count, finish, stage
+from listings_export import iso_timestamp, iter_documents, iter_listings, timestamp_ms
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BASE_URL = 'https://canadian-ai-classifieds.web.app'
+DEFAULT_WINDOW_MINUTES = 60
+DEFAULT_OUTBOX = 'price-alerts-outbox.ndjson'
+PLACEHOLDER_IMAGE = 'https://via.placeholder.com/400x300?text=No+Image'
+
+# Same rule as onListingPriceChanged
+MIN_DROP_PERCENT = 10
+MIN_DROP_AMOUNT = 50
+
+# Firestore limits: values in one 'in' filter, documents per getAll call
+IN_QUERY_LIMIT = 30
+GET_ALL_BATCH = 100
+
+
+def price_drop(old_price, new_price):
+    """(amount, percent) if the change is worth an alert, else None."""
+    if old_price is None or new_price is None or old_price <= 0 or new_price >= old_price:
+        return None
+    amount = old_price - new_price
+    # Math.round in the function rounds halves up
+    percent = math.floor(amount / old_price * 100 + 0.5)
+    if percent < MIN_DROP_PERCENT and amount < MIN_DROP_AMOUNT:
+        return None
+    return amount, percent
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def money(value):
+    return int(value) if float(value).is_integer() else round(value, 2)
+
+
+def wants_alerts(user):
+    """Mirrors the function: a missing user or priceDrops === false gets nothing."""
+    if not user or not user.get('email'):
+        return False
+    return (user.get('emailNotifications') or {}).get('priceDrops') is not False
+
+
+class MailSink:
+    """Stands in for functions/lib/email-service.js, appends each email to an NDJSON outbox."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+        self.sent = 0
+
+    def send(self, message):
+        line = json.dumps(message, ensure_ascii=False) + '\n'
+        self.file.write(line)
+        self.sent += 1
+        count('bytes.written', len(line.encode('utf-8')))
+
+    def close(self):
+        self.file.close()
+
+
+class Tally:
+    def __init__(self):
+        self.reads = 0
+        self.round_trips = 0
+        self.emails = 0
+
+
+def load_events(path, window_ms):
+    """Raw events in time order, and per window the net change of each listing."""
+    events = []
+    for event in iter_documents(path, 'events'):
+        listing_id = event.get('listingId')
+        at = timestamp_ms(event.get('at'))
+        if not listing_id or at is None:
+            continue
+        events.append((at, listing_id, number(event.get('oldPrice')), number(event.get('newPrice'))))
+    events.sort(key=lambda e: e[0])
+
+    windows = {}
+    for at, listing_id, old_price, new_price in events:
+        changes = windows.setdefault(at // window_ms * window_ms, {})
+        if listing_id in changes:
+            changes[listing_id][1] = new_price
+        else:
+            changes[listing_id] = [old_price, new_price]
+    return events, windows
+
+
+def load_favorites(path, listing_ids):
+    """listingId -> user IDs who saved it, only for listings that changed."""
+    favorites = {}
+    for doc in iter_documents(path, 'favorites'):
+        listing_id = doc.get('listingId')
+        if listing_id in listing_ids and doc.get('userId'):
+            favorites.setdefault(listing_id, []).append(doc['userId'])
+    return favorites
+
+
+def load_users(path, user_ids):
+    users = {}
+    for doc in iter_documents(path, 'users'):
+        user_id = doc.get('id') or doc.get('uid')
+        if user_id in user_ids:
+            users[user_id] = doc
+    return users
+
+
+def load_listings(path, listing_ids):
+    listings = {}
+    if path:
+        for listing in iter_listings(path, ('id', 'title', 'images')):
+            if listing.get('id') in listing_ids:
+                listings[listing['id']] = listing
+    return listings
+
+
+def per_event(events, favorites, users):
+    """What onListingPriceChanged costs today: every qualifying update fans out on its own."""
+    tally = Tally()
+    for _, listing_id, old_price, new_price in events:
+        if not price_drop(old_price, new_price):
+            continue
+        savers = favorites.get(listing_id, [])
+        # A query is billed at least one read even when it matches nothing
+        tally.reads += max(1, len(savers)) + len(savers)
+        tally.round_trips += 1 + len(savers)
+        tally.emails += sum(1 for user_id in savers if wants_alerts(users.get(user_id)))
+    return tally
+
+
+def alert_item(listing_id, old_price, new_price, drop, listing, base_url):
+    amount, percent = drop
+    images = listing.get('images') or []
+    return {
+        'listingId': listing_id,
+        'listingTitle': listing.get('title') or 'a listing you saved',
+        'oldPrice': money(old_price),
+        'newPrice': money(new_price),
+        'priceDropAmount': money(amount),
+        'priceDropPercent': percent,
+        'listingUrl': f'{base_url}/pages/listing-detail.html?id={listing_id}',
+        'listingImage': images[0] if images else PLACEHOLDER_IMAGE,
+    }
+
+
+def alert_subject(items):
+    if len(items) == 1:
+        item = items[0]
+        return (f"💰 Price drop alert: {item['listingTitle']} is now ${item['newPrice']} "
+                f"({item['priceDropPercent']}% off!)")
+    return f"💰 {len(items)} items you saved just dropped in price"
+
+
+def coalesced(windows, favorites, users, listings, sink, base_url):
+    tally = Tally()
+    for window_start, changes in sorted(windows.items()):
+        drops = {}
+        for listing_id, (old_price, new_price) in changes.items():
+            drop = price_drop(old_price, new_price)
+            if drop:
+                drops[listing_id] = (old_price, new_price, drop)
+        if not drops:
+            continue
+
+        # Favorites for every dropped listing, IN_QUERY_LIMIT listing IDs per query
+        dropped = sorted(drops)
+        per_user = {}
+        for i in range(0, len(dropped), IN_QUERY_LIMIT):
+            chunk = dropped[i:i + IN_QUERY_LIMIT]
+            matched = 0
+            for listing_id in chunk:
+                for user_id in favorites.get(listing_id, []):
+                    per_user.setdefault(user_id, []).append(listing_id)
+                    matched += 1
+            tally.reads += max(1, matched)
+            tally.round_trips += 1
+
+        # Each user read once, whatever the number of their listings that dropped
+        tally.reads += len(per_user)
+        tally.round_trips += math.ceil(len(per_user) / GET_ALL_BATCH)
+
+        for user_id, listing_ids in sorted(per_user.items()):
+            user = users.get(user_id)
+            if not wants_alerts(user):
+                continue
+            items = [alert_item(listing_id, *drops[listing_id], listings.get(listing_id, {}), base_url)
+                     for listing_id in sorted(set(listing_ids))]
+            # Biggest savings first
+            items.sort(key=lambda item: -item['priceDropAmount'])
+            sink.send({
+                'recipientEmail': user['email'],
+                'recipientName': user.get('displayName') or 'there',
+                'subject': alert_subject(items),
+                'window': iso_timestamp(window_start),
+                'items': items,
+            })
+            tally.emails += 1
+    return tally
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plan coalesced price-drop alerts against local exports.')
+    parser.add_argument('events', help='price-change events export (.ndjson/.jsonl or .json)')
+    parser.add_argument('--favorites', required=True, help='favorites export ({userId, listingId} per document)')
+    parser.add_argument('--users', required=True, help='users export')
+    parser.add_argument('--listings', help='listings export, for titles and images in the emails')
+    parser.add_argument('--window', type=float, default=DEFAULT_WINDOW_MINUTES,
+                        help='minutes of events coalesced into one round of alerts')
+    parser.add_argument('--outbox', help=f'fake mail sink (NDJSON, default {DEFAULT_OUTBOX})')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help='site URL used in listing links')
+    args = parser.parse_args()
+
+    paths = {name: os.path.abspath(getattr(args, name)) if getattr(args, name) else None
+             for name in ('events', 'favorites', 'users', 'listings', 'outbox')}
+    paths['outbox'] = paths['outbox'] or os.path.join(ROOT, DEFAULT_OUTBOX)
+    os.chdir(ROOT)
+    window_ms = max(1, int(args.window * 60_000))
+
+    with stage('alerts.load'):
+        events, windows = load_events(paths['events'], window_ms)
+        listing_ids = {e[1] for e in events}
+        favorites = load_favorites(paths['favorites'], listing_ids)
+        user_ids = {user_id for savers in favorites.values() for user_id in savers}
+        users = load_users(paths['users'], user_ids)
+        listings = load_listings(paths['listings'], listing_ids)
+
+    with stage('alerts.baseline'):
+        baseline = per_event(events, favorites, users)
+
+    sink = MailSink(paths['outbox'])
+    try:
+        with stage('alerts.fanout'):
+            planned = coalesced(windows, favorites, users, listings, sink, args.base_url.rstrip('/'))
+    finally:
+        sink.close()
+
+    qualifying = sum(1 for e in events if price_drop(e[2], e[3]))
+    print(f"Events: {len(events):,} in {len(windows):,} windows of {args.window:g} min "
+          f"({qualifying:,} qualifying drops)")
+    print(f"{'':<16}{'per-event':>12}{'coalesced':>12}{'saved':>12}")
+    for label, attr in (('Firestore reads', 'reads'), ('Round trips', 'round_trips'), ('Emails', 'emails')):
+        before, after = getattr(baseline, attr), getattr(planned, attr)
+        saved = f"{(before - after) / before:.1%}" if before else '-'
+        print(f"{label:<16}{before:>12,}{after:>12,}{saved:>12}")
+    print(f"Outbox: {sink.sent:,} emails written to {os.path.relpath(paths['outbox'], ROOT)}")
+
+    finish('alerts')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+# Price distributions for "good deal" scoring
+#
+# Groups active listings into buckets and summarises each bucket's prices so
+# the client can rate a price with a lookup instead of scanning the category.
+# Every listing lands in one bucket per level, most specific first:
+#   electronics/phones|like new|on     category/subcategory, condition, province
+#   electronics/phones|like new        category/subcategory, condition
+#   electronics/phones                 category/subcategory
+#   electronics                        category
+# js/deal-score.js builds the same keys and uses the first bucket that exists.
+#
+# Per bucket, prices are trimmed with Tukey fences on log(price), which drops
+# the $1 "make an offer" listings and the typos with extra zeros, then:
+#   n   listings in the bucket (before trimming)
+#   m   median of the trimmed prices
+#   q   trimmed prices at every 5th percentile, q[0] = min, q[20] = max
+#   h   histogram of the trimmed prices, HIST_BINS log-spaced bins from q[0] to q[20]
+# Buckets with fewer than MIN_SAMPLES listings are left out.
+#
+# Each bucket has a digest of its (id, price) pairs. Buckets whose digest
+# matches the previous run (.build-cache/prices.json) reuse their old stats,
+# so only buckets where a listing was added, removed or repriced are recomputed.
+#
+# Given a listing store (tools/listing_store.py) instead of an export, only the
+# price, status, category, subcategory, condition and province columns and the
+# id strings are read, no documents are parsed.
+#
+# Usage: python tools/price_stats.py <export or store> [--out data/prices.json] [--force]
+
+import argparse
+import json
+import os
+import sys
+import zlib
+from array import array
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:
+    sys.exit('NumPy is required: pip install -r tools/requirements.txt')
+
+from buildstats import count, finish, stage, write_text
+from filehash import CACHE_DIR
+from listing_store import ListingStore, is_store
+from listings_export import iter_listings, listing_status
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATE_PATH = os.path.join(CACHE_DIR, 'prices.json')
+# js/deal-score.js fetches /data/prices.json
+DEFAULT_OUT = os.path.join('data', 'prices.json')
+
+MIN_SAMPLES = 8
+QUANTILES = np.arange(0, 101, 5)
+HIST_BINS = 12
+FENCE = 1.5
+
+DIGEST_MASK = (1 << 64) - 1
+DIGEST_MIX = 0x9E3779B1
+
+
+def bucket_keys(listing):
+    """Keys from most to least specific; must match bucketKeys() in js/deal-score.js."""
+    # 'other' after stripping, like clean(...) || 'other' in the JS, so '  ' is 'other' too
+    category = str(listing.get('category') or '').strip().lower() or 'other'
+    subcategory = str(listing.get('subcategory') or '').strip().lower()
+    condition = str(listing.get('condition') or '').strip().lower()
+    province = str((listing.get('location') or {}).get('province') or '').strip().lower()
+
+    keys = [category]
+    if subcategory:
+        base = f'{category}/{subcategory}'
+        keys.insert(0, base)
+        if condition:
+            keys.insert(0, f'{base}|{condition}')
+            if province:
+                keys.insert(0, f'{base}|{condition}|{province}')
+    return keys
+
+
+def listing_price(listing):
+    try:
+        price = float(listing.get('price'))
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 and np.isfinite(price) else None
+
+
+def money(value):
+    return int(round(value)) if value >= 100 else round(float(value), 2)
+
+
+def bucket_stats(prices):
+    logs = np.log(prices)
+    q1, q3 = np.percentile(logs, [25, 75])
+    spread = q3 - q1
+    keep = (logs >= q1 - FENCE * spread) & (logs <= q3 + FENCE * spread)
+    trimmed = prices[keep]
+    counts, _ = np.histogram(logs[keep], bins=HIST_BINS)
+    return {
+        'n': int(prices.size),
+        'm': money(np.median(trimmed)),
+        'q': [money(v) for v in np.percentile(trimmed, QUANTILES)],
+        'h': counts.tolist(),
+    }
+
+
+class Buckets:
+    """One row per (listing, level): bucket index and price, plus a running
+    order-independent digest per bucket."""
+
+    def __init__(self):
+        self.names = {}
+        self.digests = []
+        self.row_bucket = array('i')
+        self.row_price = array('d')
+
+    def _index(self, key):
+        index = self.names.get(key)
+        if index is None:
+            index = self.names[key] = len(self.digests)
+            self.digests.append(0)
+        return index
+
+    def add(self, keys, listing_id, price):
+        token = zlib.crc32(f"{listing_id}:{price}".encode('utf-8'))
+        for key in keys:
+            index = self._index(key)
+            self.digests[index] = (self.digests[index] + token * DIGEST_MIX + 1) & DIGEST_MASK
+            self.row_bucket.append(index)
+            self.row_price.append(price)
+
+    def add_many(self, combo_keys, combo_of_row, ids, prices):
+        """add() for a whole column at once, row i having the keys combo_keys[combo_of_row[i]]."""
+        tokens = np.fromiter((zlib.crc32(f"{listing_id}:{price}".encode('utf-8'))
+                              for listing_id, price in zip(ids, prices.tolist())),
+                             dtype=np.uint64, count=len(ids))
+        # uint64 wraps like the & DIGEST_MASK in add()
+        mixed = tokens * np.uint64(DIGEST_MIX) + np.uint64(1)
+        for level in range(max((len(keys) for keys in combo_keys), default=0)):
+            level_index = np.array([self._index(keys[level]) if level < len(keys) else -1 for keys in combo_keys],
+                                   dtype=np.int64)
+            row_index = level_index[combo_of_row]
+            take = row_index >= 0
+            sums = np.zeros(len(self.digests), dtype=np.uint64)
+            np.add.at(sums, row_index[take], mixed[take])
+            for index in np.unique(row_index[take]).tolist():
+                self.digests[index] = (self.digests[index] + int(sums[index])) & DIGEST_MASK
+            self.row_bucket.frombytes(row_index[take].astype(np.int32).tobytes())
+            self.row_price.frombytes(prices[take].astype(np.float64).tobytes())
+
+
+def read_export(path, buckets):
+    skipped = 0
+    for listing in iter_listings(path):
+        if listing_status(listing) != 'active':
+            continue
+        price = listing_price(listing)
+        if price is None:
+            skipped += 1
+            continue
+        buckets.add(bucket_keys(listing), listing.get('id'), price)
+    return skipped
+
+
+def read_store(path, buckets):
+    store = ListingStore(path)
+    status = store.column('status')
+    # The store codes listing_status(), so only the 'active' label is active, like in read_export
+    active_codes = [code for code, label in enumerate(store.labels('status')) if label == 'active']
+    active = np.isin(status, active_codes)
+    prices = np.asarray(store.column('price'))
+    with np.errstate(invalid='ignore'):
+        valid = active & np.isfinite(prices) & (prices > 0)
+    rows = np.flatnonzero(valid)
+
+    # Bucket keys once per distinct (category, subcategory, condition, province)
+    columns = ('category', 'subcategory', 'condition', 'province')
+    codes = np.stack([np.asarray(store.column(name))[rows] for name in columns], axis=1)
+    combos, inverse = np.unique(codes, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    labels = [store.labels(name) for name in columns]
+    combo_keys = []
+    for combo in combos:
+        category, subcategory, condition, province = (labels[i][code] or None for i, code in enumerate(combo))
+        combo_keys.append(bucket_keys({'category': category, 'subcategory': subcategory,
+                                       'condition': condition, 'location': {'province': province}}))
+
+    buckets.add_many(combo_keys, inverse, store.strings('id', rows), prices[rows])
+    return int(np.count_nonzero(active & ~valid))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build per-bucket price distributions for deal scoring.')
+    parser.add_argument('export', help='listings export (.ndjson/.jsonl or .json) or listing store directory')
+    parser.add_argument('--out', help=f'where to write the lookup table (default {DEFAULT_OUT})')
+    parser.add_argument('--force', action='store_true', help='recompute every bucket')
+    args = parser.parse_args()
+
+    export = os.path.abspath(args.export)
+    out_path = os.path.abspath(args.out) if args.out else os.path.join(ROOT, DEFAULT_OUT)
+    os.chdir(ROOT)
+
+    previous = {}
+    if os.path.exists(STATE_PATH) and not args.force:
+        with open(STATE_PATH, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+
+    collected = Buckets()
+    with stage('prices.read'):
+        skipped = read_store(export, collected) if is_store(export) else read_export(export, collected)
+    names, digests = collected.names, collected.digests
+    row_bucket, row_price = collected.row_bucket, collected.row_price
+
+    buckets = np.frombuffer(row_bucket, dtype=np.int32) if row_bucket else np.zeros(0, np.int32)
+    prices = np.frombuffer(row_price, dtype=np.float64) if row_price else np.zeros(0)
+
+    state = {}
+    table = {}
+    recomputed = 0
+    with stage('prices.stats'):
+        order = np.argsort(buckets, kind='stable')
+        sorted_buckets = buckets[order]
+        sorted_prices = prices[order]
+        # No rows (nothing active with a price) means no buckets, not one empty bucket
+        bounds = (np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1], True])
+                  if buckets.size else [])
+        keys = list(names)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            key = keys[sorted_buckets[start]]
+            digest = f'{digests[sorted_buckets[start]]:016x}'
+            old = previous.get(key)
+            if old and old[0] == digest:
+                count('cache.hit')
+                stats = old[1]
+            else:
+                count('cache.miss')
+                recomputed += 1
+                n = end - start
+                stats = bucket_stats(sorted_prices[start:end]) if n >= MIN_SAMPLES else None
+            state[key] = [digest, stats]
+            if stats:
+                table[key] = stats
+
+    with stage('prices.write'):
+        output = {
+            'generated': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'minSamples': MIN_SAMPLES,
+            'quantileStep': int(QUANTILES[1]),
+            'buckets': dict(sorted(table.items())),
+        }
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        text = json.dumps(output, separators=(',', ':'), ensure_ascii=False) + '\n'
+        write_text(out_path, text)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        write_text(STATE_PATH, json.dumps(state, separators=(',', ':')))
+
+    removed = len(set(previous) - set(state))
+    print(f"Buckets: {len(state)} ({len(table)} with at least {MIN_SAMPLES} listings)")
+    print(f"Recomputed {recomputed}, reused {len(state) - recomputed}, dropped {removed}")
+    if skipped:
+        print(f"Skipped {skipped} active listings without a usable price")
+    print(f"Written to {os.path.relpath(out_path, ROOT)} ({len(text.encode('utf-8')):,} bytes)")
+
+    finish('prices')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+// ================================
+// Service Worker - generated by tools/precache.py
+// Do not edit sw.js by hand, edit tools/sw-template.js instead
+// ================================
+
+const MANIFEST = __PRECACHE_MANIFEST__;
+
+const SHELL_CACHE = 'shell';
+const RUNTIME_CACHE = 'runtime-v1';
+const RUNTIME_MAX_ENTRIES = __RUNTIME_MAX_ENTRIES__;
+const RUNTIME_HOSTS = __RUNTIME_HOSTS__;
+const RUNTIME_PATH_PREFIXES = __RUNTIME_PATH_PREFIXES__;
+
+// Shell assets are stored under a revisioned key so a changed file gets a new
+// cache entry and the old one can be evicted on activate
+function revisionedUrl(path) {
+    const url = new URL(path, self.registration.scope);
+    url.searchParams.set('__rev', MANIFEST.assets[path].hash);
+    return url.href;
+}
+
+// Map a request URL to a manifest path ("css/styles.css"), ignoring ?v= busters
+function shellPath(url) {
+    if (url.origin !== self.location.origin) return null;
+    const scopePath = new URL(self.registration.scope).pathname;
+    if (!url.pathname.startsWith(scopePath)) return null;
+
+    let path = url.pathname.slice(scopePath.length);
+    if (path === '' || path.endsWith('/')) path += 'index.html';
+    return MANIFEST.assets[path] ? path : null;
+}
+
+self.addEventListener('install', (event) => {
+    event.waitUntil((async () => {
+        const cache = await caches.open(SHELL_CACHE);
+        await Promise.all(Object.keys(MANIFEST.assets).map(async (path) => {
+            const key = revisionedUrl(path);
+            if (await cache.match(key)) return;
+
+            const response = await fetch(new URL(path, self.registration.scope), { cache: 'reload' });
+            if (response.ok) await cache.put(key, response);
+        }));
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil((async () => {
+        // Evict shell entries whose hash is no longer in the manifest
+        const wanted = new Set(Object.keys(MANIFEST.assets).map(revisionedUrl));
+        const cache = await caches.open(SHELL_CACHE);
+        const keys = await cache.keys();
+        await Promise.all(keys
+            .filter(request => !wanted.has(request.url))
+            .map(request => cache.delete(request)));
+
+        // Drop caches from older worker versions
+        const names = await caches.keys();
+        await Promise.all(names
+            .filter(name => name !== SHELL_CACHE && name !== RUNTIME_CACHE)
+            .map(name => caches.delete(name)));
+
+        await self.clients.claim();
+    })());
+});
+
+async function cacheFirst(request, path) {
+    const cached = await caches.match(revisionedUrl(path));
+    return cached || fetch(request);
+}
+
+async function trimCache(cache) {
+    const keys = await cache.keys();
+    // keys() returns entries in insertion order, so the oldest go first
+    const excess = keys.length - RUNTIME_MAX_ENTRIES;
+    for (let i = 0; i < excess; i++) {
+        await cache.delete(keys[i]);
+    }
+}
+
+async function updateRuntimeCache(cache, request, response) {
+    await cache.delete(request);
+    await cache.put(request, response);
+    await trimCache(cache);
+}
+
+async function staleWhileRevalidate(event) {
+    const cache = await caches.open(RUNTIME_CACHE);
+    const cached = await cache.match(event.request);
+
+    const network = fetch(event.request).then((response) => {
+        // Cross-origin images come back opaque, they are still worth keeping
+        if (response.ok || response.type === 'opaque') {
+            // Opaque responses are padded against the quota, so a write can fail
+            // (QuotaExceededError); that must not fail the response itself
+            event.waitUntil(updateRuntimeCache(cache, event.request, response.clone()).catch(() => { }));
+        }
+        return response;
+    });
+
+    if (cached) {
+        event.waitUntil(network.catch(() => { }));
+        return cached;
+    }
+    return network;
+}
+
+function isRuntimeRequest(request, url) {
+    if (request.destination === 'image') return true;
+    if (RUNTIME_HOSTS.includes(url.hostname)) return true;
+    if (url.origin !== self.location.origin) return false;
+
+    const scopePath = new URL(self.registration.scope).pathname;
+    const path = url.pathname.slice(scopePath.length);
+    return RUNTIME_PATH_PREFIXES.some(prefix => path.startsWith(prefix));
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+
+    const url = new URL(request.url);
+
+    const path = shellPath(url);
+    if (path) {
+        event.respondWith(cacheFirst(request, path));
+        return;
+    }
+
+    if (isRuntimeRequest(request, url)) {
+        event.respondWith(staleWhileRevalidate(event));
+    }
+});